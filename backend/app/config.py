@@ -6,12 +6,98 @@ class Settings(BaseSettings):
     supabase_url: str
     supabase_anon_key: str
     supabase_service_key: str
+    # Enables local verification of HS256-signed Supabase JWTs
+    supabase_jwt_secret: str = ""
+    supabase_jwt_audience: str = "authenticated"
+
+    # Auth token verification
+    auth_token_cache_size: int = 10000
+    auth_token_cache_ttl_seconds: int = 300
+    auth_jwks_cache_ttl_seconds: int = 3600
+    # Also confirm each newly seen token with Supabase Auth (catches revoked sessions)
+    auth_revocation_check: bool = False
 
     google_client_id: str
     google_client_secret: str
     google_redirect_uri: str = "http://localhost:8000/api/accounts/callback"
 
     openai_api_key: str
+    openai_model: str = "gpt-4o"
+
+    # LLM analysis throughput
+    llm_max_concurrency: int = 8
+    llm_requests_per_minute: int = 500
+    llm_tokens_per_minute: int = 30000
+    llm_max_retries: int = 5
+    # Emails analyzed per LLM request; 1 disables packing
+    analysis_pack_size: int = 8
+
+    # Content-addressed analysis cache
+    analysis_cache_size: int = 10000
+    analysis_cache_ttl_seconds: int = 7 * 24 * 3600
+    analysis_cache_db_enabled: bool = True
+
+    # Thread pool for blocking Supabase/Gmail SDK calls
+    blocking_pool_size: int = 32
+    # Supabase queries in flight at once, leaving pool threads for Gmail calls
+    db_max_concurrency: int = 16
+
+    # Per-user account id / preferences cache
+    user_cache_size: int = 10000
+    user_cache_ttl_seconds: int = 300
+
+    # Gmail sync
+    sync_max_results: int = 30
+    sync_workers: int = 4
+    # Pooled Gmail services unused for this long are dropped
+    gmail_pool_idle_seconds: int = 600
+    # Gmail services leased at once across all accounts (syncs and backfills)
+    gmail_max_concurrency: int = 8
+    # Most incremental messages one sync job takes; the rest wait for the next
+    sync_max_messages_per_job: int = 500
+    # Rows written per bulk insert/upsert request during sync
+    sync_db_chunk_size: int = 200
+    # Fetch metadata first and download bodies only for mail the pre-scorer
+    # can't settle
+    sync_metadata_triage: bool = True
+
+    # Background sync scheduler. Each account's interval shrinks while its
+    # mailbox is active and grows while it is quiet, within these bounds.
+    scheduler_enabled: bool = True
+    scheduler_tick_seconds: float = 15.0
+    scheduler_min_interval_seconds: int = 120
+    scheduler_default_interval_seconds: int = 600
+    scheduler_max_interval_seconds: int = 3600
+
+    # Historical backfill, throttled per account. Gmail allows 250 quota
+    # units/sec per user; listing a page and getting a message cost 5 each.
+    backfill_page_size: int = 100
+    backfill_messages_per_second: float = 10.0
+    backfill_quota_units_per_second: float = 100.0
+
+    # Per-user priority model trained from feedback
+    priority_model_hash_bits: int = 18
+    priority_model_learning_rate: float = 0.5
+    priority_model_min_sender_events: int = 3
+    priority_model_max_blend: float = 0.5
+
+    # Server-sent event stream of newly analyzed emails
+    stream_queue_size: int = 100
+    stream_keepalive_seconds: float = 15.0
+
+    # Gmail push notifications (Pub/Sub); disabled when no topic is set
+    gmail_pubsub_topic: str = ""
+    pubsub_verification_token: str = ""
+    push_coalesce_seconds: float = 5.0
+    watch_renewal_interval_seconds: int = 3600
+    watch_renew_before_seconds: int = 24 * 3600
+
+    # Email search; semantic search embeds emails during sync
+    semantic_search_enabled: bool = False
+    embedding_model: str = "text-embedding-3-small"
+    embedding_dimensions: int = 1536
+    embedding_input_chars: int = 2000
+    search_query_cache_size: int = 1000
 
     app_url: str = "http://localhost:3000"
     api_url: str = "http://localhost:8000"
@@ -1,6 +1,6 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from app.services.supabase import get_supabase
+from app.services.auth import authenticate, AuthenticationError
 from app.models.schemas import User
 
 security = HTTPBearer()
@@ -10,23 +10,9 @@ async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security)
 ) -> User:
     """Validate Supabase JWT and return current user."""
-    token = credentials.credentials
-    supabase = get_supabase()
-
     try:
-        response = supabase.auth.get_user(token)
-
-        if not response.user:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid or expired token"
-            )
-
-        return User(
-            id=response.user.id,
-            email=response.user.email
-        )
-    except Exception as e:
+        return await authenticate(credentials.credentials)
+    except AuthenticationError as e:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail=f"Authentication failed: {str(e)}"
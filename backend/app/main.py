@@ -1,15 +1,53 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.config import get_settings
-from app.routers import auth, accounts, emails
+from app.routers import auth, accounts, emails, webhooks
+from app.services.analysis_cache import get_analysis_cache
+from app.services.auth import auth_stats
+from app.services.backfill import get_backfill_runner
+from app.services.events import get_event_hub
+from app.services.executor import get_executor
+from app.services.gmail_pool import get_gmail_pool
+from app.services.jobs import get_sync_queue
+from app.services.prescorer import prescorer_stats
+from app.services.priority_model import get_priority_model_store
+from app.services.push import get_push_ingestor
+from app.services.scheduler import get_sync_scheduler
+from app.services.search import search_stats
+from app.services.sender_index import sender_index_stats
+from app.services.user_cache import user_cache_stats
 
 settings = get_settings()
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    sync_queue = get_sync_queue()
+    push_ingestor = get_push_ingestor()
+    backfill_runner = get_backfill_runner()
+    sync_scheduler = get_sync_scheduler()
+    event_hub = get_event_hub()
+    await event_hub.start()
+    sync_queue.start()
+    push_ingestor.start()
+    backfill_runner.start()
+    sync_scheduler.start()
+    yield
+    await sync_scheduler.stop()
+    await backfill_runner.stop()
+    await push_ingestor.stop()
+    await sync_queue.stop()
+    await event_hub.stop()
+    get_executor().shutdown()
+
+
 app = FastAPI(
     title="Trackmail API",
     description="AI-powered email priority management",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # CORS middleware
@@ -29,6 +67,7 @@ app.add_middleware(
 app.include_router(auth.router, prefix="/api")
 app.include_router(accounts.router, prefix="/api")
 app.include_router(emails.router, prefix="/api")
+app.include_router(webhooks.router, prefix="/api")
 
 
 @app.get("/")
@@ -39,3 +78,23 @@ async def root():
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"}
+
+
+@app.get("/metrics")
+async def metrics():
+    return {
+        "auth": auth_stats(),
+        "user_cache": user_cache_stats(),
+        "sender_index": sender_index_stats(),
+        "prescorer": prescorer_stats(),
+        "analysis_cache": get_analysis_cache().stats(),
+        "priority_model": get_priority_model_store().stats(),
+        "sync_queue": get_sync_queue().stats(),
+        "scheduler": get_sync_scheduler().stats(),
+        "backfill": get_backfill_runner().stats(),
+        "blocking_executor": get_executor().stats(),
+        "gmail_pool": get_gmail_pool().stats(),
+        "push": get_push_ingestor().stats(),
+        "email_stream": get_event_hub().stats(),
+        "search": search_stats(),
+    }
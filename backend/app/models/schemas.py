@@ -1,6 +1,6 @@
-from pydantic import BaseModel, EmailStr
-from typing import Optional
-from datetime import datetime
+from pydantic import BaseModel, EmailStr, Field, field_validator
+from typing import Literal, Optional
+from datetime import date, datetime
 
 
 class User(BaseModel):
@@ -51,12 +51,15 @@ class EmailBase(BaseModel):
 class EmailCreate(EmailBase):
     account_id: str
     body_text: Optional[str] = None
+    # Headers used by the pre-scorer; not stored in the database
+    signal_headers: dict[str, str] = {}
 
 
 class Email(EmailBase):
     id: str
     account_id: str
     body_text: Optional[str] = None
+    priority_score: Optional[int] = None
     created_at: datetime
 
     class Config:
@@ -87,6 +90,61 @@ class EmailWithAnalysis(Email):
     analysis: Optional[EmailAnalysis] = None
 
 
+# Longest snippet returned in feed responses
+SUMMARY_SNIPPET_CHARS = 160
+
+
+class EmailSummary(BaseModel):
+    """Feed projection of an email: no body and a truncated snippet.
+
+    Only id is guaranteed; other fields are omitted when a fields= projection
+    excludes them.
+    """
+
+    id: str
+    account_id: Optional[str] = None
+    gmail_id: Optional[str] = None
+    thread_id: Optional[str] = None
+    sender_email: Optional[str] = None
+    sender_name: Optional[str] = None
+    subject: Optional[str] = None
+    snippet: Optional[str] = None
+    received_at: Optional[datetime] = None
+    is_read: Optional[bool] = None
+    labels: Optional[list[str]] = None
+    priority_score: Optional[int] = None
+    created_at: Optional[datetime] = None
+    analysis: Optional[EmailAnalysis] = None
+    # From the sender index; present whenever sender_email is
+    is_vip_sender: Optional[bool] = None
+    sender_priority: Optional[float] = None
+
+    @field_validator("snippet")
+    @classmethod
+    def truncate_snippet(cls, value: Optional[str]) -> Optional[str]:
+        if value and len(value) > SUMMARY_SNIPPET_CHARS:
+            return value[: SUMMARY_SNIPPET_CHARS - 1].rstrip() + "…"
+        return value
+
+
+class EmailPage(BaseModel):
+    items: list[EmailSummary]
+    next_cursor: Optional[str] = None
+
+
+class ThreadSummary(BaseModel):
+    account_id: str
+    thread_id: str
+    subject: str
+    summary: str
+    priority_score: int
+    message_count: int
+    # Null once the last email is deleted (ON DELETE SET NULL)
+    last_email_id: Optional[str] = None
+    last_sender_email: Optional[str] = None
+    last_received_at: datetime
+
+
 class UserPreferences(BaseModel):
     id: str
     user_id: str
@@ -101,9 +159,66 @@ class UserPreferencesUpdate(BaseModel):
 
 class PriorityFeedback(BaseModel):
     is_correct: bool
-    actual_priority: Optional[int] = None
+    actual_priority: Optional[int] = Field(None, ge=0, le=100)
 
 
 class SyncResponse(BaseModel):
     synced_count: int
     analyzed_count: int
+
+
+class SyncJob(BaseModel):
+    id: str
+    account_id: str
+    user_id: str
+    status: Literal["queued", "running", "completed", "failed"]
+    fetched: int = 0
+    # Messages whose full body was downloaded; the rest were triaged on metadata
+    bodies_fetched: int = 0
+    inserted: int = 0
+    analyzed: int = 0
+    # The job stopped at sync_max_messages_per_job with more mail waiting
+    has_more: bool = False
+    # A push notification arrived while running; another sync follows this one
+    rerun_requested: bool = False
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
+class AccountSchedule(BaseModel):
+    account_id: str
+    email_address: str
+    state: Literal["idle", "queued", "running"]
+    interval_seconds: float
+    last_sync_at: Optional[datetime] = None
+    next_sync_at: datetime
+    # How long the account has been due without a sync starting
+    lag_seconds: float
+    last_inserted: Optional[int] = None
+    last_error: Optional[str] = None
+
+
+class BackfillRequest(BaseModel):
+    # Only import mail received in this window (inclusive dates)
+    after: Optional[date] = None
+    before: Optional[date] = None
+
+
+class BackfillJob(BaseModel):
+    id: str
+    account_id: str
+    user_id: str
+    status: Literal["running", "completed", "failed"]
+    query: Optional[str] = None
+    pages: int = 0
+    listed: int = 0
+    inserted: int = 0
+    analyzed: int = 0
+    # Inbox size when the backfill started; only set for whole-inbox imports
+    estimated_total: Optional[int] = None
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+    finished_at: Optional[datetime] = None
@@ -1,21 +1,31 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.responses import RedirectResponse
-from datetime import datetime, timezone
 import secrets
 
 from app.dependencies import get_current_user
-from app.models.schemas import User, EmailAccount, GmailAuthUrl, SyncResponse
-from app.services.supabase import get_supabase_admin
+from app.models.schemas import (
+    AccountSchedule,
+    BackfillJob,
+    BackfillRequest,
+    EmailAccount,
+    GmailAuthUrl,
+    SyncJob,
+    User,
+)
+from app.services import db
+from app.services.backfill import backfill_query, get_backfill_runner
+from app.services.executor import run_blocking
 from app.services.gmail import (
     get_auth_url,
     exchange_code_for_tokens,
     get_gmail_service,
     get_user_email,
-    fetch_emails,
-    get_email_details,
-    parse_email,
 )
-from app.services.analyzer import analyze_email
+from app.services.gmail_pool import get_gmail_pool
+from app.services.jobs import get_sync_queue
+from app.services.push import push_enabled, register_watch
+from app.services.scheduler import get_sync_scheduler
+from app.services.user_cache import invalidate_accounts
 from app.config import get_settings
 
 router = APIRouter(prefix="/accounts", tags=["accounts"])
@@ -27,16 +37,7 @@ oauth_states: dict[str, str] = {}
 @router.get("", response_model=list[EmailAccount])
 async def list_accounts(current_user: User = Depends(get_current_user)):
     """List all connected email accounts for the current user."""
-    supabase = get_supabase_admin()
-
-    response = (
-        supabase.table("email_accounts")
-        .select("id, user_id, email_address, last_sync_at, created_at")
-        .eq("user_id", current_user.id)
-        .execute()
-    )
-
-    return response.data
+    return await db.list_accounts(current_user.id)
 
 
 @router.post("/connect", response_model=GmailAuthUrl)
@@ -61,21 +62,29 @@ async def gmail_callback(code: str, state: str):
         )
 
     try:
-        tokens = exchange_code_for_tokens(code)
-        service = get_gmail_service(tokens["access_token"], tokens["refresh_token"])
-        email_address = get_user_email(service)
-        supabase = get_supabase_admin()
+        tokens = await run_blocking(exchange_code_for_tokens, code)
+        service = await run_blocking(
+            get_gmail_service, tokens["access_token"], tokens["refresh_token"]
+        )
+        email_address = await run_blocking(get_user_email, service)
 
-        supabase.table("email_accounts").upsert(
+        account = await db.upsert_account(
             {
                 "user_id": user_id,
                 "email_address": email_address,
                 "access_token": tokens["access_token"],
                 "refresh_token": tokens["refresh_token"],
                 "token_expiry": tokens["token_expiry"].isoformat(),
-            },
-            on_conflict="user_id,email_address",
-        ).execute()
+            }
+        )
+        invalidate_accounts(user_id)
+
+        if push_enabled():
+            try:
+                await register_watch(account)
+            except Exception:
+                # The renewal loop retries accounts without a watch
+                pass
 
         return RedirectResponse(url=f"{settings.app_url}/dashboard?connected=true")
 
@@ -85,116 +94,81 @@ async def gmail_callback(code: str, state: str):
         )
 
 
-@router.post("/{account_id}/sync", response_model=SyncResponse)
+@router.post(
+    "/{account_id}/sync",
+    response_model=SyncJob,
+    status_code=status.HTTP_202_ACCEPTED,
+)
 async def sync_emails(account_id: str, current_user: User = Depends(get_current_user)):
-    """Sync emails from Gmail and analyze them."""
-    supabase = get_supabase_admin()
-
-    account_response = (
-        supabase.table("email_accounts")
-        .select("*")
-        .eq("id", account_id)
-        .eq("user_id", current_user.id)
-        .single()
-        .execute()
-    )
+    """Queue a background sync of emails from Gmail and their analysis."""
+    account = await db.get_account(account_id, current_user.id)
 
-    if not account_response.data:
+    if not account:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Account not found"
         )
 
-    account = account_response.data
+    return get_sync_queue().enqueue(account_id, current_user.id)
 
-    service = get_gmail_service(account["access_token"], account["refresh_token"])
 
-    prefs_response = (
-        supabase.table("user_preferences")
-        .select("*")
-        .eq("user_id", current_user.id)
-        .single()
-        .execute()
-    )
+@router.get("/schedule", response_model=list[AccountSchedule])
+async def get_schedule(current_user: User = Depends(get_current_user)):
+    """Background sync state, interval and lag of each of the user's accounts."""
+    return get_sync_scheduler().account_states(current_user.id)
+
+
+@router.get("/sync-jobs/{job_id}", response_model=SyncJob)
+async def get_sync_job(job_id: str, current_user: User = Depends(get_current_user)):
+    """Get the status and progress of a sync job."""
+    job = get_sync_queue().get(job_id)
+
+    if not job or job.user_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Sync job not found"
+        )
 
-    vip_contacts = []
-    vip_domains = []
-    if prefs_response.data:
-        vip_contacts = prefs_response.data.get("vip_contacts", [])
-        vip_domains = prefs_response.data.get("vip_domains", [])
+    return job
 
-    messages, _ = fetch_emails(service, max_results=30)
 
-    synced_count = 0
-    analyzed_count = 0
+@router.post(
+    "/{account_id}/backfill",
+    response_model=BackfillJob,
+    status_code=status.HTTP_202_ACCEPTED,
+)
+async def start_backfill(
+    account_id: str,
+    request: BackfillRequest,
+    current_user: User = Depends(get_current_user),
+):
+    """Import the account's existing inbox, or a date window of it, in the background."""
+    account = await db.get_account(account_id, current_user.id)
 
-    for msg in messages:
-        existing = (
-            supabase.table("emails")
-            .select("id")
-            .eq("account_id", account_id)
-            .eq("gmail_id", msg["id"])
-            .execute()
+    if not account:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Account not found"
+        )
+    if request.after and request.before and request.after > request.before:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="after must not be later than before",
         )
 
-        if existing.data:
-            continue
-
-        full_message = get_email_details(service, msg["id"])
-        email_data = parse_email(full_message, account_id)
-
-        insert_response = (
-            supabase.table("emails")
-            .insert(
-                {
-                    "account_id": email_data.account_id,
-                    "gmail_id": email_data.gmail_id,
-                    "thread_id": email_data.thread_id,
-                    "sender_email": email_data.sender_email,
-                    "sender_name": email_data.sender_name,
-                    "subject": email_data.subject,
-                    "snippet": email_data.snippet,
-                    "body_text": email_data.body_text,
-                    "received_at": email_data.received_at.isoformat(),
-                    "is_read": email_data.is_read,
-                    "labels": email_data.labels,
-                }
-            )
-            .execute()
+    return await get_backfill_runner().start_backfill(
+        account, backfill_query(request.after, request.before)
+    )
+
+
+@router.get("/{account_id}/backfill", response_model=BackfillJob)
+async def get_backfill(account_id: str, current_user: User = Depends(get_current_user)):
+    """Get the progress of the account's latest backfill."""
+    job = await db.get_backfill_job(account_id)
+
+    if not job or job["user_id"] != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Backfill not found"
         )
 
-        if insert_response.data:
-            email_id = insert_response.data[0]["id"]
-            synced_count += 1
-
-            # Analyze email
-            analysis = analyze_email(
-                email_id=email_id,
-                sender_email=email_data.sender_email,
-                sender_name=email_data.sender_name,
-                subject=email_data.subject,
-                body_text=email_data.body_text or "",
-                received_at=email_data.received_at,
-                vip_contacts=vip_contacts,
-                vip_domains=vip_domains,
-            )
-
-            supabase.table("email_analysis").insert(
-                {
-                    "email_id": email_id,
-                    "priority_score": analysis.priority_score,
-                    "explanation": analysis.explanation,
-                    "action_items": analysis.action_items,
-                    "urgency_factors": analysis.urgency_factors,
-                }
-            ).execute()
-
-            analyzed_count += 1
-
-    supabase.table("email_accounts").update(
-        {"last_sync_at": datetime.now(timezone.utc).isoformat()}
-    ).eq("id", account_id).execute()
-
-    return SyncResponse(synced_count=synced_count, analyzed_count=analyzed_count)
+    return job
 
 
 @router.delete("/{account_id}")
@@ -202,17 +176,11 @@ async def disconnect_account(
     account_id: str, current_user: User = Depends(get_current_user)
 ):
     """Disconnect a Gmail account."""
-    supabase = get_supabase_admin()
-
-    response = (
-        supabase.table("email_accounts")
-        .delete()
-        .eq("id", account_id)
-        .eq("user_id", current_user.id)
-        .execute()
-    )
+    deleted = await db.delete_account(account_id, current_user.id)
+    invalidate_accounts(current_user.id)
+    get_gmail_pool().evict(account_id)
 
-    if not response.data:
+    if not deleted:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Account not found"
         )
@@ -1,124 +1,334 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, status
-from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+from typing import AsyncIterator, Literal, Optional
 
 from app.dependencies import get_current_user
 from app.models.schemas import (
     User,
     EmailWithAnalysis,
+    EmailSummary,
+    EmailPage,
+    ThreadSummary,
     PriorityFeedback,
     UserPreferences,
     UserPreferencesUpdate,
 )
-from app.services.supabase import get_supabase_admin
+from app.config import get_settings
+from app.services import db
+from app.services.events import get_event_hub
+from app.services.pagination import SORT_KEYS, decode_cursor, encode_cursor
+from app.services.priority_model import get_priority_model_store
+from app.services.search import search_emails
+from app.services.sender_index import (
+    SenderIndex,
+    get_sender_index,
+    invalidate_sender_index,
+)
+from app.services.sync import load_body
+from app.services.user_cache import invalidate_preferences
 
 router = APIRouter(prefix="/emails", tags=["emails"])
+settings = get_settings()
+
+
+FIELDS_DESCRIPTION = (
+    "Comma-separated fields to return, e.g. subject,sender_email,analysis. "
+    "id is always included."
+)
+
+
+def _pop_analysis(email: dict) -> Optional[dict]:
+    analysis = email.pop("email_analysis", None)
+    # PostgREST embeds one-to-one relations as an object, older versions as a list
+    if isinstance(analysis, list):
+        analysis = analysis[0] if analysis else None
+    return analysis
+
+
+def _with_analysis(email: dict) -> EmailWithAnalysis:
+    analysis = _pop_analysis(email)
+    return EmailWithAnalysis(**email, analysis=analysis)
+
+
+def _summary(email: dict, sender_index: Optional[SenderIndex] = None) -> EmailSummary:
+    if "email_analysis" in email:
+        email["analysis"] = _pop_analysis(email)
+    if sender_index is not None and "sender_email" in email:
+        email["is_vip_sender"] = sender_index.is_vip(email["sender_email"])
+        history = sender_index.historical_priority(email["sender_email"])
+        email["sender_priority"] = round(history, 1) if history is not None else None
+    return EmailSummary(**email)
 
 
-@router.get("", response_model=list[EmailWithAnalysis])
+async def _sender_index_for(
+    user_id: str, columns: Optional[list[str]]
+) -> Optional[SenderIndex]:
+    if columns is not None and "sender_email" not in columns:
+        return None
+    return await get_sender_index(user_id)
+
+
+def _parse_fields(
+    fields: Optional[str], required: list[str] = None
+) -> tuple[Optional[list[str]], bool]:
+    """Turn a fields= projection into (columns, with_analysis)."""
+    if not fields:
+        return None, True
+
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in db.SUMMARY_COLUMNS and f != "analysis"]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(unknown)}",
+        )
+
+    columns = ["id", *(required or []), *(f for f in requested if f != "analysis")]
+    return list(dict.fromkeys(columns)), "analysis" in requested
+
+
+@router.get(
+    "",
+    response_model=list[EmailSummary],
+    response_model_exclude_unset=True,
+)
 async def list_emails(
     current_user: User = Depends(get_current_user),
     min_priority: Optional[int] = Query(None, ge=0, le=100),
     max_priority: Optional[int] = Query(None, ge=0, le=100),
     is_read: Optional[bool] = None,
+    analyzed_only: bool = False,
+    sort: Literal["received_at", "priority"] = "received_at",
     limit: int = Query(50, ge=1, le=100),
     offset: int = Query(0, ge=0),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
 ):
-    """List emails with their analysis, optionally filtered by priority."""
-    supabase = get_supabase_admin()
+    """List emails with their analysis, optionally filtered by priority.
+
+    Bodies are not included; fetch GET /emails/{email_id} for the full email.
+    Priority filters only match analyzed emails.
+    """
+    columns, with_analysis = _parse_fields(fields)
 
     # Get user's account IDs
-    accounts_response = (
-        supabase.table("email_accounts")
-        .select("id")
-        .eq("user_id", current_user.id)
-        .execute()
-    )
+    account_ids = await db.get_account_ids(current_user.id)
 
-    if not accounts_response.data:
+    if not account_ids:
         return []
 
-    account_ids = [a["id"] for a in accounts_response.data]
-
-    query = (
-        supabase.table("emails")
-        .select("*, email_analysis(*)")
-        .in_("account_id", account_ids)
-        .order("received_at", desc=True)
-        .range(offset, offset + limit - 1)
+    emails = await db.list_emails(
+        account_ids,
+        is_read=is_read,
+        min_priority=min_priority,
+        max_priority=max_priority,
+        analyzed_only=analyzed_only,
+        sort=sort,
+        limit=limit,
+        offset=offset,
+        columns=columns,
+        with_analysis=with_analysis,
     )
 
-    if is_read is not None:
-        query = query.eq("is_read", is_read)
+    sender_index = await _sender_index_for(current_user.id, columns)
+    return [_summary(email, sender_index) for email in emails]
 
-    emails_response = query.execute()
 
-    results = []
-    for email in emails_response.data:
-        analysis = email.pop("email_analysis", None)
-        if analysis and len(analysis) > 0:
-            analysis_data = analysis[0]
+@router.get("/feed", response_model=EmailPage, response_model_exclude_unset=True)
+async def get_email_feed(
+    current_user: User = Depends(get_current_user),
+    min_priority: Optional[int] = Query(None, ge=0, le=100),
+    max_priority: Optional[int] = Query(None, ge=0, le=100),
+    is_read: Optional[bool] = None,
+    analyzed_only: bool = False,
+    sort: Literal["received_at", "priority"] = "received_at",
+    limit: int = Query(50, ge=1, le=100),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+):
+    """List emails a page at a time using keyset (cursor) pagination.
+
+    Pass the returned next_cursor to get the following page; pages stay
+    stable while new mail arrives. sort=priority only includes analyzed
+    emails. Bodies are not included.
+    """
+    columns, with_analysis = _parse_fields(fields, required=SORT_KEYS[sort])
+
+    after = None
+    if cursor:
+        try:
+            after = decode_cursor(cursor, sort)
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail=str(e)
+            )
 
-            if min_priority is not None and analysis_data["priority_score"] < min_priority:
-                continue
-            if max_priority is not None and analysis_data["priority_score"] > max_priority:
-                continue
+    account_ids = await db.get_account_ids(current_user.id)
+
+    if not account_ids:
+        return EmailPage(items=[])
+
+    # Fetch one extra row to learn whether another page exists
+    emails = await db.list_emails(
+        account_ids,
+        is_read=is_read,
+        min_priority=min_priority,
+        max_priority=max_priority,
+        analyzed_only=analyzed_only or sort == "priority",
+        sort=sort,
+        limit=limit + 1,
+        after=after,
+        columns=columns,
+        with_analysis=with_analysis,
+    )
 
-            results.append(EmailWithAnalysis(**email, analysis=analysis_data))
-        else:
-            if min_priority is None and max_priority is None:
-                results.append(EmailWithAnalysis(**email, analysis=None))
+    next_cursor = None
+    if len(emails) > limit:
+        emails = emails[:limit]
+        next_cursor = encode_cursor(sort, emails[-1])
 
-    return results
+    sender_index = await _sender_index_for(current_user.id, columns)
+    return EmailPage(
+        items=[_summary(email, sender_index) for email in emails],
+        next_cursor=next_cursor,
+    )
 
 
-@router.get("/priority", response_model=list[EmailWithAnalysis])
+@router.get(
+    "/priority",
+    response_model=list[EmailSummary],
+    response_model_exclude_unset=True,
+)
 async def get_priority_emails(
     current_user: User = Depends(get_current_user),
     threshold: int = Query(60, ge=0, le=100),
+    sort: Literal["received_at", "priority"] = "received_at",
     limit: int = Query(20, ge=1, le=50),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
 ):
     """Get high-priority emails above the threshold."""
     return await list_emails(
         current_user=current_user,
         min_priority=threshold,
+        max_priority=None,
+        is_read=None,
+        analyzed_only=True,
+        sort=sort,
         limit=limit,
         offset=0,
+        fields=fields,
     )
 
 
-@router.get("/{email_id}", response_model=EmailWithAnalysis)
-async def get_email(email_id: str, current_user: User = Depends(get_current_user)):
-    """Get a single email with its analysis."""
-    supabase = get_supabase_admin()
-
-    accounts_response = (
-        supabase.table("email_accounts")
-        .select("id")
-        .eq("user_id", current_user.id)
-        .execute()
+@router.get("/search", response_model=list[EmailWithAnalysis])
+async def search(
+    q: str = Query(..., min_length=1, max_length=500),
+    current_user: User = Depends(get_current_user),
+    mode: Literal["text", "semantic"] = "text",
+    limit: int = Query(20, ge=1, le=50),
+    offset: int = Query(0, ge=0),
+):
+    """Search emails, best match first.
+
+    mode=text is full-text search over subject, sender and body and
+    supports quoted phrases, OR and -exclusions. mode=semantic matches by
+    meaning and is only available when semantic search is enabled.
+    """
+    if mode == "semantic" and not settings.semantic_search_enabled:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Semantic search is not enabled",
+        )
+
+    account_ids = await db.get_account_ids(current_user.id)
+
+    if not account_ids:
+        return []
+
+    emails = await search_emails(account_ids, q, mode, limit, offset)
+    return [_with_analysis(email) for email in emails]
+
+
+@router.get("/threads", response_model=list[ThreadSummary])
+async def list_threads(
+    current_user: User = Depends(get_current_user),
+    min_priority: Optional[int] = Query(None, ge=0, le=100),
+    limit: int = Query(50, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+):
+    """List threads ranked by their latest priority, one entry per thread.
+
+    Each entry carries the thread's rolling summary and its latest message.
+    """
+    account_ids = await db.get_account_ids(current_user.id)
+
+    if not account_ids:
+        return []
+
+    return await db.list_threads(
+        account_ids, min_priority=min_priority, limit=limit, offset=offset
     )
 
-    account_ids = [a["id"] for a in accounts_response.data]
 
-    email_response = (
-        supabase.table("emails")
-        .select("*, email_analysis(*)")
-        .eq("id", email_id)
-        .in_("account_id", account_ids)
-        .single()
-        .execute()
+async def _stream_events(
+    request: Request, user_id: str, threshold: int
+) -> AsyncIterator[str]:
+    # Subscribed here, not in the route, so the finally below always runs
+    # for it, even if the client disconnects before streaming starts
+    subscription = get_event_hub().subscribe(user_id, threshold)
+    try:
+        while not subscription.overflowed or not subscription.queue.empty():
+            email = await subscription.get(settings.stream_keepalive_seconds)
+            if await request.is_disconnected():
+                return
+            if email is None:
+                yield ": keepalive\n\n"
+                continue
+            yield f"event: email\nid: {email.id}\ndata: {email.model_dump_json()}\n\n"
+
+        # The client fell behind; it should reconnect and catch up via /feed
+        yield "event: overflow\ndata: {}\n\n"
+    finally:
+        get_event_hub().unsubscribe(subscription)
+
+
+@router.get("/stream")
+async def stream_emails(
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    threshold: int = Query(60, ge=0, le=100),
+):
+    """Stream newly analyzed emails at or above the threshold as server-sent events.
+
+    Each `email` event carries an EmailWithAnalysis as JSON. An `overflow`
+    event means the client fell too far behind and was disconnected.
+    """
+    return StreamingResponse(
+        _stream_events(request, current_user.id, threshold),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
-    if not email_response.data:
+
+@router.get("/{email_id}", response_model=EmailWithAnalysis)
+async def get_email(email_id: str, current_user: User = Depends(get_current_user)):
+    """Get a single email with its analysis.
+
+    Emails triaged without a body during sync have it fetched from Gmail
+    and stored on first read.
+    """
+    account_ids = await db.get_account_ids(current_user.id)
+
+    email = await db.get_email(email_id, account_ids)
+
+    if not email:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Email not found"
         )
 
-    email = email_response.data
-    analysis = email.pop("email_analysis", None)
-    analysis_data = analysis[0] if analysis and len(analysis) > 0 else None
+    if email["body_text"] is None:
+        email["body_text"] = await load_body(email)
 
-    return EmailWithAnalysis(**email, analysis=analysis_data)
+    return _with_analysis(email)
 
 
 @router.post("/{email_id}/feedback")
@@ -127,35 +337,42 @@ async def submit_feedback(
     feedback: PriorityFeedback,
     current_user: User = Depends(get_current_user),
 ):
-    """Submit feedback on priority scoring accuracy."""
-    supabase = get_supabase_admin()
-
-    accounts_response = (
-        supabase.table("email_accounts")
-        .select("id")
-        .eq("user_id", current_user.id)
-        .execute()
-    )
+    """Submit feedback on priority scoring accuracy.
 
-    account_ids = [a["id"] for a in accounts_response.data]
+    Feedback is stored and trains the user's local priority model, which
+    adjusts the scores of newly synced emails.
+    """
+    account_ids = await db.get_account_ids(current_user.id)
 
-    email_response = (
-        supabase.table("emails")
-        .select("id")
-        .eq("id", email_id)
-        .in_("account_id", account_ids)
-        .execute()
-    )
+    email = await db.get_email(email_id, account_ids)
 
-    if not email_response.data:
+    if not email:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Email not found"
         )
 
+    analysis = _pop_analysis(email)
+    predicted = analysis["priority_score"] if analysis else None
+
+    await db.insert_feedback(
+        {
+            "user_id": current_user.id,
+            "email_id": email_id,
+            "is_correct": feedback.is_correct,
+            "predicted_priority": predicted,
+            "actual_priority": feedback.actual_priority,
+        }
+    )
+
     if feedback.actual_priority is not None:
-        supabase.table("email_analysis").update(
-            {"priority_score": feedback.actual_priority}
-        ).eq("email_id", email_id).execute()
+        await db.update_priority(email_id, feedback.actual_priority)
+
+    # A bare "incorrect" says nothing about the right score, so it is not trained on
+    target = feedback.actual_priority
+    if target is None and feedback.is_correct:
+        target = predicted
+    if target is not None:
+        await get_priority_model_store().train(current_user.id, email, target)
 
     return {"message": "Feedback recorded"}
 
@@ -163,31 +380,12 @@ async def submit_feedback(
 @router.get("/preferences/me", response_model=UserPreferences)
 async def get_preferences(current_user: User = Depends(get_current_user)):
     """Get user's email preferences."""
-    supabase = get_supabase_admin()
-
-    response = (
-        supabase.table("user_preferences")
-        .select("*")
-        .eq("user_id", current_user.id)
-        .single()
-        .execute()
-    )
+    preferences = await db.get_preferences(current_user.id)
 
-    if not response.data:
-        insert_response = (
-            supabase.table("user_preferences")
-            .insert(
-                {
-                    "user_id": current_user.id,
-                    "vip_contacts": [],
-                    "vip_domains": [],
-                }
-            )
-            .execute()
-        )
-        return UserPreferences(**insert_response.data[0])
+    if not preferences:
+        preferences = await db.create_preferences(current_user.id)
 
-    return UserPreferences(**response.data)
+    return UserPreferences(**preferences)
 
 
 @router.put("/preferences/me", response_model=UserPreferences)
@@ -196,8 +394,6 @@ async def update_preferences(
     current_user: User = Depends(get_current_user),
 ):
     """Update user's email preferences."""
-    supabase = get_supabase_admin()
-
     update_data = {}
     if preferences.vip_contacts is not None:
         update_data["vip_contacts"] = preferences.vip_contacts
@@ -210,16 +406,8 @@ async def update_preferences(
             detail="No fields to update",
         )
 
-    response = (
-        supabase.table("user_preferences")
-        .upsert(
-            {
-                "user_id": current_user.id,
-                **update_data,
-            },
-            on_conflict="user_id",
-        )
-        .execute()
-    )
+    updated = await db.upsert_preferences(current_user.id, update_data)
+    invalidate_preferences(current_user.id)
+    invalidate_sender_index(current_user.id)
 
-    return UserPreferences(**response.data[0])
+    return UserPreferences(**updated)
@@ -0,0 +1,37 @@
+import secrets
+from fastapi import APIRouter, HTTPException, Request, Response, status
+
+from app.config import get_settings
+from app.services.push import decode_push_message, get_push_ingestor, push_enabled
+
+router = APIRouter(prefix="/webhooks", tags=["webhooks"])
+settings = get_settings()
+
+
+@router.post("/gmail", status_code=status.HTTP_204_NO_CONTENT)
+async def gmail_push(request: Request, token: str = ""):
+    """Receive Gmail change notifications pushed by Cloud Pub/Sub.
+
+    The push subscription URL must carry ?token=<PUBSUB_VERIFICATION_TOKEN>.
+    """
+    if not push_enabled() or not settings.pubsub_verification_token:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Push is not enabled"
+        )
+
+    # Compared as bytes: compare_digest rejects non-ASCII str with TypeError
+    if not secrets.compare_digest(
+        token.encode(), settings.pubsub_verification_token.encode()
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Invalid token"
+        )
+
+    try:
+        email_address, history_id = decode_push_message(await request.json())
+    except (KeyError, TypeError, ValueError):
+        # Acknowledge malformed messages so Pub/Sub does not redeliver them
+        return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+    await get_push_ingestor().notify(email_address, history_id)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,135 @@
+import hashlib
+import re
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from app.config import get_settings
+from app.models.schemas import EmailAnalysisCreate
+from app.services.cache import TTLCache
+from app.services.supabase import get_supabase_admin
+
+settings = get_settings()
+
+# Only the part of the body the model sees affects its answer
+CACHE_BODY_CHARS = 3000
+
+_whitespace = re.compile(r"\s+")
+
+
+def _normalize(text: Optional[str]) -> str:
+    return _whitespace.sub(" ", (text or "").strip().lower())
+
+
+def analysis_cache_key(
+    sender_email: str,
+    subject: str,
+    body_text: Optional[str],
+    vip_contacts: list[str],
+    vip_domains: list[str],
+) -> str:
+    """Content hash of everything that influences an email's analysis."""
+    parts = [
+        _normalize(sender_email),
+        _normalize(subject),
+        _normalize((body_text or "")[:CACHE_BODY_CHARS]),
+        ",".join(sorted(_normalize(v) for v in vip_contacts)),
+        ",".join(sorted(_normalize(v) for v in vip_domains)),
+    ]
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class AnalysisCache:
+    """Two-tier cache of analysis results keyed by analysis_cache_key.
+
+    Lookups check an in-process LRU first and then the analysis_cache table;
+    rows read from the table are promoted into the LRU.
+    """
+
+    def __init__(self, maxsize: int, ttl: int, use_db: bool = True):
+        self.ttl = ttl
+        self.use_db = use_db
+        self.memory = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.db_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get_many(self, keys: list[str]) -> dict[str, dict]:
+        """Return cached analysis fields for the keys that are present."""
+        found: dict[str, dict] = {}
+        for key in set(keys):
+            cached = self.memory.get(key)
+            if cached is not None:
+                found[key] = cached
+
+        remaining = [key for key in set(keys) if key not in found]
+        if remaining and self.use_db:
+            cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.ttl)
+            try:
+                response = (
+                    get_supabase_admin()
+                    .table("analysis_cache")
+                    .select("cache_key, priority_score, explanation, action_items, urgency_factors")
+                    .in_("cache_key", remaining)
+                    .gte("created_at", cutoff.isoformat())
+                    .execute()
+                )
+                rows = response.data
+            except Exception:
+                # The cache is an optimization; treat an unavailable table as a miss
+                rows = []
+
+            for row in rows:
+                key = row.pop("cache_key")
+                found[key] = row
+                self.memory.set(key, row)
+
+        with self._lock:
+            self.db_hits += sum(1 for key in remaining if key in found)
+            self.misses += sum(1 for key in remaining if key not in found)
+
+        return found
+
+    def set_many(self, entries: dict[str, EmailAnalysisCreate]) -> None:
+        """Store analyses under their cache keys in both tiers."""
+        if not entries:
+            return
+
+        rows = []
+        for key, analysis in entries.items():
+            fields = analysis.model_dump(exclude={"email_id"})
+            self.memory.set(key, fields)
+            rows.append({"cache_key": key, **fields})
+
+        if self.use_db:
+            try:
+                get_supabase_admin().table("analysis_cache").upsert(
+                    rows, on_conflict="cache_key"
+                ).execute()
+            except Exception:
+                pass
+
+    def stats(self) -> dict:
+        memory = self.memory.stats()
+        with self._lock:
+            db_hits = self.db_hits
+            misses = self.misses
+        hits = memory["hits"] + db_hits
+        total = hits + misses
+        return {
+            "memory": memory,
+            "db_hits": db_hits,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / total, 4) if total else 0.0,
+        }
+
+
+analysis_cache = AnalysisCache(
+    maxsize=settings.analysis_cache_size,
+    ttl=settings.analysis_cache_ttl_seconds,
+    use_db=settings.analysis_cache_db_enabled,
+)
+
+
+def get_analysis_cache() -> AnalysisCache:
+    return analysis_cache
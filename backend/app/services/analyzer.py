@@ -1,25 +1,18 @@
+import asyncio
 import json
+import re
 from datetime import datetime, timezone
-from openai import OpenAI
 from app.config import get_settings
 from app.models.schemas import EmailAnalysisCreate
+from app.services.analysis_cache import analysis_cache_key, get_analysis_cache
+from app.services.executor import run_blocking
+from app.services.llm import get_llm_engine
+from app.services.prescorer import prescore_email
+from app.services.sender_index import SenderIndex
 
 settings = get_settings()
-client = OpenAI(api_key=settings.openai_api_key)
 
-ANALYSIS_PROMPT = """You are an email priority analyzer for busy professionals. Analyze the following email and determine its priority level.
-
-Email Details:
-- From: {sender_email} ({sender_name})
-- Subject: {subject}
-- Received: {received_at}
-- Content: {body_text}
-
-VIP Contacts: {vip_contacts}
-VIP Domains: {vip_domains}
-
-Analyze this email and provide:
-1. Priority Score (0-100): How urgently does this need attention?
+SCORING_RUBRIC = """1. Priority Score (0-100): How urgently does this need attention?
    - 80-100: Critical/Urgent - needs immediate response
    - 60-79: High priority - respond within hours
    - 40-59: Medium priority - respond within a day
@@ -32,7 +25,21 @@ Analyze this email and provide:
    - Are there direct questions requiring response?
    - Is there a clear deadline mentioned?
    - Is it a personal/direct email vs automated/mass email?
-   - Sentiment (frustrated, concerned, casual)
+   - Sentiment (frustrated, concerned, casual)"""
+
+ANALYSIS_PROMPT = """You are an email priority analyzer for busy professionals. Analyze the following email and determine its priority level.
+
+Email Details:
+- From: {sender_email} ({sender_name})
+- Subject: {subject}
+- Received: {received_at}
+- Content: {body_text}
+
+VIP Contacts: {vip_contacts}
+VIP Domains: {vip_domains}
+
+Analyze this email and provide:
+""" + SCORING_RUBRIC + """
 
 Respond in JSON format only:
 {{
@@ -48,55 +55,96 @@ Respond in JSON format only:
     }}
 }}"""
 
+PACKED_ANALYSIS_PROMPT = """You are an email priority analyzer for busy professionals. Analyze each of the following emails independently and determine its priority level.
 
-def analyze_email(
-    email_id: str,
+VIP Contacts: {vip_contacts}
+VIP Domains: {vip_domains}
+
+For each email provide:
+""" + SCORING_RUBRIC + """
+
+Emails:
+{emails}
+
+Respond in JSON format only, with one object per email in a JSON array:
+[
+    {{
+        "email_id": "<id exactly as given>",
+        "priority_score": <0-100>,
+        "explanation": "<one sentence explaining priority>",
+        "action_items": ["<action 1>", "<action 2>"],
+        "urgency_factors": {{
+            "is_vip": <true/false>,
+            "has_deadline": <true/false>,
+            "has_questions": <true/false>,
+            "is_urgent": <true/false>,
+            "sentiment": "<positive/neutral/negative/urgent>"
+        }}
+    }}
+]"""
+
+PACKED_EMAIL_TEMPLATE = """--- Email id: {email_id} ---
+- From: {sender_email} ({sender_name})
+- Subject: {subject}
+- Received: {received_at}
+- Content: {body_text}"""
+
+# Response tokens budgeted per email in a packed request
+PACKED_TOKENS_PER_EMAIL = 250
+
+THREAD_ANALYSIS_PROMPT = """You are an email priority analyzer for busy professionals. A new message has arrived in an ongoing email thread. Using the thread summary for context, determine the priority of the thread now that this message has arrived.
+
+Thread so far ({message_count} earlier messages, last priority {last_score}):
+{summary}
+
+New message:
+- From: {sender_email} ({sender_name})
+- Received: {received_at}
+- Content: {body_text}
+
+VIP Contacts: {vip_contacts}
+VIP Domains: {vip_domains}
+
+Analyze the new message and provide:
+""" + SCORING_RUBRIC + """
+
+Respond in JSON format only:
+{{
+    "priority_score": <0-100>,
+    "explanation": "<one sentence explaining priority>",
+    "action_items": ["<action 1>", "<action 2>"],
+    "urgency_factors": {{
+        "is_vip": <true/false>,
+        "has_deadline": <true/false>,
+        "has_questions": <true/false>,
+        "is_urgent": <true/false>,
+        "sentiment": "<positive/neutral/negative/urgent>"
+    }},
+    "thread_summary": "<updated summary of the whole thread in at most {summary_words} words>"
+}}"""
+
+# Earlier messages are summarized, so only the new part of a reply is sent
+THREAD_BODY_CHARS = 1500
+THREAD_SUMMARY_WORDS = 80
+
+SYSTEM_PROMPT = "You are an email priority analyzer. Always respond with valid JSON only."
+
+QUOTE_HEADER_RE = re.compile(
+    r"^\s*(?:On .{0,200}wrote:|-{2,}\s*Original Message\s*-{2,}|From: .+)\s*$",
+    re.IGNORECASE | re.MULTILINE,
+)
+
+
+def build_analysis_messages(
     sender_email: str,
     sender_name: str | None,
     subject: str,
     body_text: str,
     received_at: datetime,
-    vip_contacts: list[str] = None,
-    vip_domains: list[str] = None,
-) -> EmailAnalysisCreate:
-    """Analyze an email using GPT-4 and return priority analysis."""
-
-    vip_contacts = vip_contacts or []
-    vip_domains = vip_domains or []
-
-    # Quick pre-filter for obvious low-priority emails
-    low_priority_indicators = [
-        "unsubscribe",
-        "newsletter",
-        "noreply",
-        "no-reply",
-        "notifications@",
-        "marketing@",
-    ]
-
-    sender_lower = sender_email.lower()
-    subject_lower = subject.lower()
-
-    # Check if obviously promotional/automated
-    is_likely_automated = any(ind in sender_lower for ind in low_priority_indicators)
-
-    if is_likely_automated and not any(
-        vip in sender_lower for vip in vip_contacts
-    ):
-        return EmailAnalysisCreate(
-            email_id=email_id,
-            priority_score=10,
-            explanation="Automated or marketing email detected",
-            action_items=[],
-            urgency_factors={
-                "is_vip": False,
-                "has_deadline": False,
-                "has_questions": False,
-                "is_urgent": False,
-                "sentiment": "neutral",
-            },
-        )
-
+    vip_contacts: list[str],
+    vip_domains: list[str],
+) -> list[dict]:
+    """Build the chat messages for a single-email analysis request."""
     prompt = ANALYSIS_PROMPT.format(
         sender_email=sender_email,
         sender_name=sender_name or "Unknown",
@@ -107,64 +155,311 @@ def analyze_email(
         vip_domains=", ".join(vip_domains) if vip_domains else "None specified",
     )
 
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are an email priority analyzer. Always respond with valid JSON only.",
-                },
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0.3,
-            max_tokens=500,
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": prompt},
+    ]
+
+
+def build_packed_messages(
+    emails: list[dict], vip_contacts: list[str], vip_domains: list[str]
+) -> list[dict]:
+    """Build the chat messages for analyzing several emails in one request."""
+    blocks = [
+        PACKED_EMAIL_TEMPLATE.format(
+            email_id=email["id"],
+            sender_email=email["sender_email"],
+            sender_name=email.get("sender_name") or "Unknown",
+            subject=email["subject"],
+            received_at=email["received_at"].isoformat(),
+            body_text=(email.get("body_text") or "")[:3000] or "(No content)",
         )
+        for email in emails
+    ]
 
-        result_text = response.choices[0].message.content.strip()
+    prompt = PACKED_ANALYSIS_PROMPT.format(
+        emails="\n\n".join(blocks),
+        vip_contacts=", ".join(vip_contacts) if vip_contacts else "None specified",
+        vip_domains=", ".join(vip_domains) if vip_domains else "None specified",
+    )
 
-        if result_text.startswith("```"):
-            result_text = result_text.split("```")[1]
-            if result_text.startswith("json"):
-                result_text = result_text[4:]
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": prompt},
+    ]
 
-        result = json.loads(result_text)
 
-        return EmailAnalysisCreate(
-            email_id=email_id,
-            priority_score=max(0, min(100, result.get("priority_score", 50))),
-            explanation=result.get("explanation", "Unable to determine priority"),
-            action_items=result.get("action_items", []),
-            urgency_factors=result.get("urgency_factors", {}),
-        )
+def strip_quoted_reply(body_text: str) -> str:
+    """Drop the quoted earlier messages from a reply, keeping only the new text."""
+    match = QUOTE_HEADER_RE.search(body_text)
+    if match and match.start() > 0:
+        body_text = body_text[: match.start()]
+    lines = [line for line in body_text.splitlines() if not line.lstrip().startswith(">")]
+    return "\n".join(lines).strip()
+
+
+def build_thread_messages(
+    email: dict,
+    state: dict,
+    vip_contacts: list[str],
+    vip_domains: list[str],
+) -> list[dict]:
+    """Build the chat messages for analyzing a new message in a known thread."""
+    body_text = strip_quoted_reply(email.get("body_text") or "")
+    prompt = THREAD_ANALYSIS_PROMPT.format(
+        message_count=state["message_count"],
+        last_score=state["priority_score"],
+        summary=state["summary"],
+        sender_email=email["sender_email"],
+        sender_name=email.get("sender_name") or "Unknown",
+        received_at=email["received_at"].isoformat(),
+        body_text=body_text[:THREAD_BODY_CHARS] or "(No content)",
+        vip_contacts=", ".join(vip_contacts) if vip_contacts else "None specified",
+        vip_domains=", ".join(vip_domains) if vip_domains else "None specified",
+        summary_words=THREAD_SUMMARY_WORDS,
+    )
+
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": prompt},
+    ]
+
+
+def parse_json_response(result_text: str):
+    """Parse a model response, tolerating markdown code fences."""
+    if result_text.startswith("```"):
+        result_text = result_text.split("```")[1]
+        if result_text.startswith("json"):
+            result_text = result_text[4:]
+
+    return json.loads(result_text)
+
+
+def analysis_from_result(email_id: str, result: dict) -> EmailAnalysisCreate:
+    """Build an EmailAnalysisCreate from a parsed model result."""
+    return EmailAnalysisCreate(
+        email_id=email_id,
+        priority_score=max(0, min(100, result.get("priority_score", 50))),
+        explanation=result.get("explanation", "Unable to determine priority"),
+        action_items=result.get("action_items", []),
+        urgency_factors=result.get("urgency_factors", {}),
+    )
+
+
+FAILED_EXPLANATION = "Analysis failed, assigned medium priority"
+
+
+def failed_analysis(email_id: str, error: Exception) -> EmailAnalysisCreate:
+    """Medium-priority placeholder used when analysis fails."""
+    return EmailAnalysisCreate(
+        email_id=email_id,
+        priority_score=50,
+        explanation=f"{FAILED_EXPLANATION}: {str(error)[:50]}",
+        action_items=[],
+        urgency_factors={},
+    )
+
+
+def is_failed_analysis(analysis: EmailAnalysisCreate) -> bool:
+    """True for placeholders from failed_analysis, which must not be cached."""
+    return analysis.explanation.startswith(FAILED_EXPLANATION)
+
+
+async def _analyze_with_llm(
+    email_id: str,
+    sender_email: str,
+    sender_name: str | None,
+    subject: str,
+    body_text: str,
+    received_at: datetime,
+    vip_contacts: list[str],
+    vip_domains: list[str],
+) -> EmailAnalysisCreate:
+    messages = build_analysis_messages(
+        sender_email, sender_name, subject, body_text, received_at,
+        vip_contacts, vip_domains,
+    )
+
+    try:
+        result_text = await get_llm_engine().complete(messages, max_tokens=500)
+        return analysis_from_result(email_id, parse_json_response(result_text))
 
     except Exception as e:
-        return EmailAnalysisCreate(
-            email_id=email_id,
-            priority_score=50,
-            explanation=f"Analysis failed, assigned medium priority: {str(e)[:50]}",
-            action_items=[],
-            urgency_factors={},
+        return failed_analysis(email_id, e)
+
+
+def _analyze_one(
+    email: dict, vip_contacts: list[str], vip_domains: list[str]
+):
+    # Callers have already run the pre-scorer on these emails
+    return _analyze_with_llm(
+        email["id"],
+        email["sender_email"],
+        email.get("sender_name"),
+        email["subject"],
+        email.get("body_text") or "",
+        email["received_at"],
+        vip_contacts,
+        vip_domains,
+    )
+
+
+async def analyze_email_pack(
+    emails: list[dict],
+    vip_contacts: list[str] = None,
+    vip_domains: list[str] = None,
+) -> list[EmailAnalysisCreate]:
+    """Analyze several emails in a single LLM request.
+
+    The rubric and VIP lists are sent once for the whole pack. Entries the
+    model omits or returns malformed are re-analyzed individually. Results
+    are returned in input order.
+    """
+    vip_contacts = vip_contacts or []
+    vip_domains = vip_domains or []
+
+    if len(emails) == 1:
+        return [await _analyze_one(emails[0], vip_contacts, vip_domains)]
+
+    results: dict[str, EmailAnalysisCreate] = {}
+    messages = build_packed_messages(emails, vip_contacts, vip_domains)
+
+    try:
+        result_text = await get_llm_engine().complete(
+            messages, max_tokens=PACKED_TOKENS_PER_EMAIL * len(emails)
+        )
+        entries = parse_json_response(result_text)
+        if isinstance(entries, dict):
+            entries = entries.get("results") or entries.get("emails") or []
+
+        wanted = {email["id"] for email in emails}
+        for entry in entries:
+            if not isinstance(entry, dict):
+                continue
+            email_id = str(entry.get("email_id", ""))
+            if email_id not in wanted or email_id in results:
+                continue
+            try:
+                results[email_id] = analysis_from_result(email_id, entry)
+            except (TypeError, ValueError):
+                continue
+    except Exception:
+        # Fall through and analyze every email on its own
+        pass
+
+    missing = [email for email in emails if email["id"] not in results]
+    if missing:
+        retried = await asyncio.gather(
+            *(_analyze_one(email, vip_contacts, vip_domains) for email in missing)
         )
+        for email, analysis in zip(missing, retried):
+            results[email["id"]] = analysis
 
+    return [results[email["id"]] for email in emails]
+
+
+async def analyze_thread_message(
+    email: dict,
+    state: dict,
+    vip_contacts: list[str],
+    vip_domains: list[str],
+) -> tuple[EmailAnalysisCreate, str]:
+    """Analyze a new message using its thread's summary instead of the full history.
+
+    Returns the analysis and the updated thread summary; on failure the
+    summary is returned unchanged.
+    """
+    messages = build_thread_messages(email, state, vip_contacts, vip_domains)
+
+    try:
+        result_text = await get_llm_engine().complete(messages, max_tokens=600)
+        result = parse_json_response(result_text)
+        analysis = analysis_from_result(email["id"], result)
+        summary = str(result.get("thread_summary") or state["summary"])
+        return analysis, summary
 
-def batch_analyze_emails(
+    except Exception as e:
+        return failed_analysis(email["id"], e), state["summary"]
+
+
+async def batch_analyze_emails(
     emails: list[dict],
     vip_contacts: list[str] = None,
     vip_domains: list[str] = None,
+    pack_size: int = None,
+    sender_index: SenderIndex = None,
 ) -> list[EmailAnalysisCreate]:
-    """Analyze multiple emails."""
-    results = []
+    """Analyze multiple emails concurrently, returning results in input order.
+
+    Emails not scored by the pre-scorer or found in the analysis cache are packed
+    pack_size at a time into shared LLM requests (defaults to
+    settings.analysis_pack_size; 1 disables packing). Pass the user's
+    sender_index to let the pre-scorer use sender history.
+    """
+    vip_contacts = vip_contacts or []
+    vip_domains = vip_domains or []
+    pack_size = pack_size or settings.analysis_pack_size
+    sender_index = sender_index or SenderIndex(vip_contacts, vip_domains)
+
+    results: dict[str, EmailAnalysisCreate] = {}
+    cache_keys: dict[str, str] = {}
     for email in emails:
-        analysis = analyze_email(
-            email_id=email["id"],
-            sender_email=email["sender_email"],
-            sender_name=email.get("sender_name"),
-            subject=email["subject"],
-            body_text=email.get("body_text", ""),
-            received_at=email["received_at"],
-            vip_contacts=vip_contacts,
-            vip_domains=vip_domains,
+        prescored = prescore_email(email, sender_index)
+        if prescored:
+            results[email["id"]] = prescored
+        else:
+            cache_keys[email["id"]] = analysis_cache_key(
+                email["sender_email"],
+                email["subject"],
+                email.get("body_text"),
+                vip_contacts,
+                vip_domains,
+            )
+
+    cache = get_analysis_cache()
+    cached = await run_blocking(cache.get_many, list(cache_keys.values()))
+
+    # Duplicates within the batch are analyzed once and share the result
+    to_analyze = []
+    first_with_key: dict[str, str] = {}
+    for email in emails:
+        key = cache_keys.get(email["id"])
+        if key is None:
+            continue
+        if key in cached:
+            results[email["id"]] = EmailAnalysisCreate(email_id=email["id"], **cached[key])
+        elif key not in first_with_key:
+            first_with_key[key] = email["id"]
+            to_analyze.append(email)
+
+    if pack_size > 1:
+        packs = [
+            to_analyze[i : i + pack_size] for i in range(0, len(to_analyze), pack_size)
+        ]
+        analyzed = await asyncio.gather(
+            *(analyze_email_pack(pack, vip_contacts, vip_domains) for pack in packs)
+        )
+        for analysis in (a for pack in analyzed for a in pack):
+            results[analysis.email_id] = analysis
+    else:
+        analyzed = await asyncio.gather(
+            *(_analyze_one(email, vip_contacts, vip_domains) for email in to_analyze)
         )
-        results.append(analysis)
-    return results
+        for analysis in analyzed:
+            results[analysis.email_id] = analysis
+
+    await run_blocking(
+        cache.set_many,
+        {
+            cache_keys[email["id"]]: results[email["id"]]
+            for email in to_analyze
+            if not is_failed_analysis(results[email["id"]])
+        },
+    )
+
+    for email in emails:
+        if email["id"] not in results:
+            source = results[first_with_key[cache_keys[email["id"]]]]
+            results[email["id"]] = source.model_copy(update={"email_id": email["id"]})
+
+    return [results[email["id"]] for email in emails]
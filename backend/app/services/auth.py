@@ -0,0 +1,161 @@
+import hashlib
+import threading
+import time
+import jwt
+from app.config import get_settings
+from app.models.schemas import User
+from app.services.cache import TTLCache
+from app.services.executor import run_blocking
+from app.services.supabase import get_supabase
+
+settings = get_settings()
+
+SYMMETRIC_ALGORITHMS = {"HS256", "HS384", "HS512"}
+ASYMMETRIC_ALGORITHMS = {"RS256", "RS384", "RS512", "ES256", "ES384", "EdDSA"}
+
+jwks_client = jwt.PyJWKClient(
+    f"{settings.supabase_url}/auth/v1/.well-known/jwks.json",
+    cache_keys=True,
+    lifespan=settings.auth_jwks_cache_ttl_seconds,
+)
+
+# A token with an unknown key id refetches the JWKS at most this often, so
+# made-up kids can't make every request hit the JWKS endpoint
+JWKS_REFRESH_COOLDOWN_SECONDS = 60
+_jwks_refresh_lock = threading.Lock()
+_jwks_refreshed_at = float("-inf")
+
+token_cache = TTLCache(
+    maxsize=settings.auth_token_cache_size,
+    ttl=settings.auth_token_cache_ttl_seconds,
+)
+
+
+class AuthenticationError(Exception):
+    """Raised when a token is invalid, expired or revoked."""
+
+
+class LocalVerificationUnavailable(Exception):
+    """Raised when no key is available to verify a token locally."""
+
+
+def _signing_key(token: str, algorithm: str):
+    if algorithm in SYMMETRIC_ALGORITHMS:
+        if not settings.supabase_jwt_secret:
+            raise LocalVerificationUnavailable("SUPABASE_JWT_SECRET is not set")
+        return settings.supabase_jwt_secret
+
+    if algorithm in ASYMMETRIC_ALGORITHMS:
+        try:
+            return _jwks_signing_key(jwt.get_unverified_header(token).get("kid"))
+        except jwt.PyJWKClientError as e:
+            raise LocalVerificationUnavailable(str(e)) from e
+
+    raise AuthenticationError(f"Unsupported token algorithm: {algorithm}")
+
+
+def _jwks_signing_key(kid: str):
+    """Look up kid in the cached JWKS.
+
+    Unknown kids refetch the key set at most once per
+    JWKS_REFRESH_COOLDOWN_SECONDS; otherwise they are rejected.
+    """
+    global _jwks_refreshed_at
+
+    for key in jwks_client.get_signing_keys():
+        if key.key_id == kid:
+            return key.key
+
+    with _jwks_refresh_lock:
+        if time.monotonic() - _jwks_refreshed_at < JWKS_REFRESH_COOLDOWN_SECONDS:
+            raise AuthenticationError("Unknown signing key")
+        _jwks_refreshed_at = time.monotonic()
+
+    for key in jwks_client.get_signing_keys(refresh=True):
+        if key.key_id == kid:
+            return key.key
+    raise AuthenticationError("Unknown signing key")
+
+
+def verify_token_locally(token: str) -> dict:
+    """Verify a Supabase JWT's signature, expiry and audience; return its claims.
+
+    Blocking: the first use of a JWKS key id fetches the key set.
+    """
+    try:
+        algorithm = jwt.get_unverified_header(token).get("alg", "")
+    except jwt.PyJWTError as e:
+        raise AuthenticationError(str(e)) from e
+
+    key = _signing_key(token, algorithm)
+
+    try:
+        return jwt.decode(
+            token,
+            key,
+            algorithms=[algorithm],
+            audience=settings.supabase_jwt_audience,
+            options={"require": ["exp", "sub"]},
+        )
+    except jwt.PyJWTError as e:
+        raise AuthenticationError(str(e)) from e
+
+
+def _unverified_expiry(token: str):
+    """The token's exp claim without verifying it, or None."""
+    try:
+        exp = jwt.decode(token, options={"verify_signature": False}).get("exp")
+    except jwt.PyJWTError:
+        return None
+    return exp if isinstance(exp, (int, float)) else None
+
+
+def _get_user_remote(token: str) -> User:
+    response = get_supabase().auth.get_user(token)
+
+    if not response or not response.user:
+        raise AuthenticationError("Invalid or expired token")
+
+    return User(id=response.user.id, email=response.user.email)
+
+
+async def authenticate(token: str) -> User:
+    """Resolve a bearer token to a User, verifying it locally when possible.
+
+    Verified tokens are cached until the earlier of their expiry and the
+    cache TTL. Supabase Auth is only called when no verification key is
+    available, or on first sight of a token when auth_revocation_check is on.
+    """
+    cache_key = hashlib.sha256(token.encode("utf-8")).hexdigest()
+    cached = token_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    try:
+        claims = await run_blocking(verify_token_locally, token)
+    except LocalVerificationUnavailable:
+        claims = None
+
+    if claims is None or settings.auth_revocation_check:
+        try:
+            user = await run_blocking(_get_user_remote, token)
+        except AuthenticationError:
+            raise
+        except Exception as e:
+            raise AuthenticationError(str(e)) from e
+    else:
+        user = User(id=claims["sub"], email=claims.get("email") or "")
+
+    # Remotely verified tokens are capped by their own (unverified) exp, which
+    # Supabase has just accepted; without one they aren't cached at all
+    expiry = claims["exp"] if claims is not None else _unverified_expiry(token)
+    ttl = settings.auth_token_cache_ttl_seconds
+    ttl = min(ttl, expiry - time.time()) if expiry is not None else 0
+    if ttl > 0:
+        token_cache.set(cache_key, user, ttl=ttl)
+
+    return user
+
+
+def auth_stats() -> dict:
+    return {"token_cache": token_cache.stats()}
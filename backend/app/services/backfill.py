@@ -0,0 +1,202 @@
+import asyncio
+import logging
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional
+from app.config import get_settings
+from app.services import db
+from app.services.executor import run_blocking
+from app.services.gmail import fetch_emails, get_inbox_total
+from app.services.gmail_pool import get_gmail_pool
+from app.services.rate_limit import TokenBucket
+from app.services.sender_index import get_sender_index
+from app.services.sync import fetch_messages, process_emails
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Gmail API quota units per call (users.messages.list / users.messages.get)
+LIST_QUOTA_UNITS = 5
+GET_QUOTA_UNITS = 5
+
+
+def backfill_query(after: Optional[date], before: Optional[date]) -> Optional[str]:
+    """Gmail search query for a received-date window, inclusive of both ends."""
+    terms = []
+    if after:
+        terms.append(f"after:{after:%Y/%m/%d}")
+    if before:
+        # Gmail's before: is exclusive
+        terms.append(f"before:{before + timedelta(days=1):%Y/%m/%d}")
+    return " ".join(terms) or None
+
+
+async def _take(bucket: TokenBucket, amount: float) -> None:
+    """Acquire any amount from a bucket, in steps of at most its capacity."""
+    while amount > 0:
+        step = min(amount, bucket.capacity)
+        await bucket.acquire(step)
+        amount -= step
+
+
+class BackfillRunner:
+    """Imports an account's existing inbox page by page in the background.
+
+    Progress, including the Gmail page token, is saved to backfill_jobs
+    after every page, so a backfill interrupted by a crash or restart
+    resumes from its last page when the runner starts again. Re-running a
+    page is harmless: messages already stored are skipped. Each backfill
+    is throttled to backfill_messages_per_second and
+    backfill_quota_units_per_second so it doesn't starve regular syncs of
+    the account's Gmail quota.
+    """
+
+    def __init__(self):
+        self._tasks: dict[str, asyncio.Task] = {}
+        self._resume_task: asyncio.Task | None = None
+        self.pages = 0
+        self.messages = 0
+
+    async def start_backfill(self, account: dict, query: Optional[str]) -> dict:
+        """Start a backfill for an account, or return the one in progress.
+
+        A failed backfill over the same window resumes from its last page.
+        """
+        job = await db.get_backfill_job(account["id"])
+        if job and job["status"] == "running":
+            self._launch(job)
+            return job
+
+        if job and job["status"] == "failed" and job["query"] == query:
+            job.update(status="running", error=None)
+            await db.update_backfill_job(job["id"], {"status": "running", "error": None})
+        else:
+            job = await db.create_backfill_job(
+                {
+                    "account_id": account["id"],
+                    "user_id": account["user_id"],
+                    "status": "running",
+                    "query": query,
+                }
+            )
+        self._launch(job)
+        return job
+
+    def _launch(self, job: dict) -> None:
+        task = self._tasks.get(job["account_id"])
+        if task and not task.done():
+            return
+        self._tasks[job["account_id"]] = asyncio.create_task(self._run(job))
+
+    def start(self) -> None:
+        self._resume_task = asyncio.create_task(self._resume())
+
+    async def stop(self) -> None:
+        # Jobs stay "running" in the database and resume on the next start
+        tasks = [*self._tasks.values(), *filter(None, [self._resume_task])]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    async def _resume(self) -> None:
+        try:
+            jobs = await db.list_running_backfill_jobs()
+        except Exception:
+            logger.exception("Failed to load backfill jobs to resume")
+            return
+        for job in jobs:
+            self._launch(job)
+
+    async def _run(self, job: dict) -> None:
+        try:
+            await self._backfill(job)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.exception("Backfill %s failed", job["id"])
+            await db.update_backfill_job(
+                job["id"], {"status": "failed", "error": str(e)[:200]}
+            )
+        finally:
+            self._tasks.pop(job["account_id"], None)
+
+    async def _backfill(self, job: dict) -> None:
+        account = await db.get_account(job["account_id"])
+        if not account:
+            raise LookupError("Account not found")
+
+        prefs = await db.get_preferences(account["user_id"]) or {}
+        sender_index = await get_sender_index(account["user_id"])
+        messages_bucket = TokenBucket(settings.backfill_messages_per_second, per=1)
+        quota_bucket = TokenBucket(settings.backfill_quota_units_per_second, per=1)
+
+        # Each page is budgeted up front for its listing plus a metadata and
+        # a full get per message, so no Gmail slot is held while throttled
+        gets_per_message = 2 if settings.sync_metadata_triage else 1
+        page_units = LIST_QUOTA_UNITS + (
+            settings.backfill_page_size * gets_per_message * GET_QUOTA_UNITS
+        )
+
+        pool = get_gmail_pool()
+        page_token = job.get("page_token")
+        while True:
+            await _take(messages_bucket, settings.backfill_page_size)
+            await _take(quota_bucket, page_units)
+
+            service = await pool.lease(account)
+            try:
+                if job.get("estimated_total") is None and not job["query"]:
+                    job["estimated_total"] = await run_blocking(get_inbox_total, service)
+
+                refs, next_token = await run_blocking(
+                    fetch_emails,
+                    service,
+                    settings.backfill_page_size,
+                    page_token,
+                    job["query"],
+                )
+                emails, _ = await fetch_messages(
+                    service, account, [ref["id"] for ref in refs], sender_index
+                )
+            finally:
+                token_update = pool.release(service)
+            if token_update:
+                await db.update_account(account["id"], token_update)
+
+            inserted, analyzed = await process_emails(
+                account, emails, prefs, sender_index, live=False
+            )
+            self.pages += 1
+            self.messages += len(refs)
+
+            progress = {
+                "page_token": next_token,
+                "pages": job.get("pages", 0) + 1,
+                "listed": job.get("listed", 0) + len(refs),
+                "inserted": job.get("inserted", 0) + inserted,
+                "analyzed": job.get("analyzed", 0) + analyzed,
+                "estimated_total": job.get("estimated_total"),
+            }
+            if not next_token:
+                progress["status"] = "completed"
+                progress["finished_at"] = datetime.now(timezone.utc).isoformat()
+            await db.update_backfill_job(job["id"], progress)
+            job.update(progress)
+
+            if not next_token:
+                return
+            page_token = next_token
+
+    def stats(self) -> dict:
+        return {
+            "active": len(self._tasks),
+            "pages": self.pages,
+            "messages": self.messages,
+        }
+
+
+backfill_runner = BackfillRunner()
+
+
+def get_backfill_runner() -> BackfillRunner:
+    return backfill_runner
@@ -0,0 +1,529 @@
+import asyncio
+from datetime import datetime, timezone
+from typing import Optional
+from app.config import get_settings
+from app.models.schemas import EmailAnalysisCreate, EmailCreate
+from app.services.executor import run_blocking
+from app.services.pagination import keyset_filter
+from app.services.user_cache import account_ids_cache, preferences_cache
+from app.services.supabase import get_supabase_admin
+
+_db_slots = asyncio.Semaphore(get_settings().db_max_concurrency)
+
+
+async def execute(query):
+    """Execute a PostgREST query builder off the event loop.
+
+    Building a query is cheap; only execute does network I/O, so routers
+    build queries here and await this instead of calling execute directly.
+    At most db_max_concurrency queries run at once.
+    """
+    async with _db_slots:
+        return await run_blocking(query.execute)
+
+
+def _table(name: str):
+    return get_supabase_admin().table(name)
+
+
+# Email accounts
+
+
+async def list_accounts(user_id: str) -> list[dict]:
+    response = await execute(
+        _table("email_accounts")
+        .select("id, user_id, email_address, last_sync_at, created_at")
+        .eq("user_id", user_id)
+    )
+    return response.data
+
+
+async def get_account_ids(user_id: str) -> list[str]:
+    """Get the user's account ids, served from the per-user cache when possible."""
+    cached = account_ids_cache.get(user_id)
+    if cached is not None:
+        return list(cached)
+
+    response = await execute(
+        _table("email_accounts").select("id").eq("user_id", user_id)
+    )
+    account_ids = [a["id"] for a in response.data]
+    account_ids_cache.set(user_id, account_ids)
+    return account_ids
+
+
+async def list_sync_accounts() -> list[dict]:
+    """Every connected account, with what the sync scheduler needs."""
+    response = await execute(
+        _table("email_accounts").select("id, user_id, email_address, last_sync_at")
+    )
+    return response.data
+
+
+async def get_account(account_id: str, user_id: Optional[str] = None) -> Optional[dict]:
+    """Get a full account row, optionally scoped to its owner."""
+    query = _table("email_accounts").select("*").eq("id", account_id)
+    if user_id is not None:
+        query = query.eq("user_id", user_id)
+
+    response = await execute(query)
+    return response.data[0] if response.data else None
+
+
+async def upsert_account(account: dict) -> dict:
+    response = await execute(
+        _table("email_accounts").upsert(account, on_conflict="user_id,email_address")
+    )
+    return response.data[0]
+
+
+async def get_accounts_by_email(email_address: str) -> list[dict]:
+    response = await execute(
+        _table("email_accounts")
+        .select("id, user_id")
+        .eq("email_address", email_address)
+    )
+    return response.data
+
+
+async def get_accounts_with_expiring_watch(before: datetime) -> list[dict]:
+    """Accounts whose Gmail watch is missing or expires before `before`."""
+    response = await execute(
+        _table("email_accounts")
+        .select("*")
+        .or_(f'watch_expiration.is.null,watch_expiration.lt."{before.isoformat()}"')
+    )
+    return response.data
+
+
+async def update_account(account_id: str, fields: dict) -> None:
+    await execute(_table("email_accounts").update(fields).eq("id", account_id))
+
+
+async def delete_account(account_id: str, user_id: str) -> bool:
+    response = await execute(
+        _table("email_accounts")
+        .delete()
+        .eq("id", account_id)
+        .eq("user_id", user_id)
+    )
+    return bool(response.data)
+
+
+# Emails
+
+# Columns of emails that may appear in feed responses (everything but the body)
+SUMMARY_COLUMNS = [
+    "id",
+    "account_id",
+    "gmail_id",
+    "thread_id",
+    "sender_email",
+    "sender_name",
+    "subject",
+    "snippet",
+    "received_at",
+    "is_read",
+    "labels",
+    "priority_score",
+    "created_at",
+]
+
+# Columns of emails returned with full emails (excludes the search vector)
+DETAIL_SELECT = ", ".join([*SUMMARY_COLUMNS, "body_text"]) + ", email_analysis(*)"
+
+
+async def list_emails(
+    account_ids: list[str],
+    is_read: Optional[bool] = None,
+    min_priority: Optional[int] = None,
+    max_priority: Optional[int] = None,
+    analyzed_only: bool = False,
+    sort: str = "received_at",
+    limit: int = 50,
+    offset: int = 0,
+    after: Optional[dict] = None,
+    columns: Optional[list[str]] = None,
+    with_analysis: bool = True,
+) -> list[dict]:
+    """List emails with their analysis, filtered and sorted in the database.
+
+    Filters and sorts on emails.priority_score, the trigger-maintained copy
+    of email_analysis.priority_score, so that pages are always full and
+    served from idx_emails_account_priority. Passing `after` (a decoded
+    cursor) switches from offset to keyset pagination. Selects
+    SUMMARY_COLUMNS unless a narrower list of columns is given.
+    """
+    select = ", ".join(columns or SUMMARY_COLUMNS)
+    if with_analysis:
+        select += ", email_analysis(*)"
+
+    query = _table("emails").select(select).in_("account_id", account_ids)
+
+    if is_read is not None:
+        query = query.eq("is_read", is_read)
+    if min_priority is not None:
+        query = query.gte("priority_score", min_priority)
+    if max_priority is not None:
+        query = query.lte("priority_score", max_priority)
+    if analyzed_only:
+        query = query.not_.is_("priority_score", "null")
+
+    if sort == "priority":
+        query = query.order("priority_score", desc=True, nullsfirst=False)
+
+    query = query.order("received_at", desc=True).order("id", desc=True)
+
+    if after is not None:
+        query = query.or_(keyset_filter(after)).limit(limit)
+    else:
+        query = query.range(offset, offset + limit - 1)
+
+    response = await execute(query)
+    return response.data
+
+
+async def get_existing_gmail_ids(account_id: str, gmail_ids: list[str]) -> set[str]:
+    if not gmail_ids:
+        return set()
+
+    response = await execute(
+        _table("emails")
+        .select("gmail_id")
+        .eq("account_id", account_id)
+        .in_("gmail_id", gmail_ids)
+    )
+    return {row["gmail_id"] for row in response.data}
+
+
+async def get_unanalyzed_emails(
+    account_id: str, created_before: datetime, limit: int
+) -> list[dict]:
+    """Stored emails with no analysis yet, oldest first.
+
+    These are left behind when a sync fails or is cancelled between storing
+    emails and storing their analysis. emails.priority_score is only NULL
+    while there is no email_analysis row (see sync_email_priority_score).
+    """
+    response = await execute(
+        _table("emails")
+        .select(", ".join([*SUMMARY_COLUMNS, "body_text"]) + ", email_analysis(id)")
+        .eq("account_id", account_id)
+        .is_("priority_score", "null")
+        .is_("email_analysis", "null")
+        .lt("created_at", created_before.isoformat())
+        .order("received_at")
+        .limit(limit)
+    )
+    return [
+        {key: value for key, value in row.items() if key != "email_analysis"}
+        for row in response.data
+    ]
+
+
+async def upsert_emails(emails: list[EmailCreate]) -> list[dict]:
+    """Insert emails in one request, skipping ones already stored.
+
+    Returns id, gmail_id and created_at for the rows actually inserted.
+    """
+    if not emails:
+        return []
+
+    response = await execute(
+        _table("emails").upsert(
+            [
+                email.model_dump(mode="json", exclude={"signal_headers"})
+                for email in emails
+            ],
+            on_conflict="account_id,gmail_id",
+            ignore_duplicates=True,
+        )
+    )
+    return [
+        {"id": row["id"], "gmail_id": row["gmail_id"], "created_at": row["created_at"]}
+        for row in response.data
+    ]
+
+
+async def get_email(email_id: str, account_ids: list[str]) -> Optional[dict]:
+    response = await execute(
+        _table("emails")
+        .select(DETAIL_SELECT)
+        .eq("id", email_id)
+        .in_("account_id", account_ids)
+    )
+    return response.data[0] if response.data else None
+
+
+async def update_email_body(email_id: str, body_text: str) -> None:
+    await execute(_table("emails").update({"body_text": body_text}).eq("id", email_id))
+
+
+async def upsert_analyses(analyses: list[EmailAnalysisCreate]) -> list[dict]:
+    """Upsert analyses in one request and return the stored rows."""
+    if not analyses:
+        return []
+
+    response = await execute(
+        _table("email_analysis").upsert(
+            [
+                {
+                    "email_id": analysis.email_id,
+                    "priority_score": analysis.priority_score,
+                    "explanation": analysis.explanation,
+                    "action_items": analysis.action_items,
+                    "urgency_factors": analysis.urgency_factors,
+                }
+                for analysis in analyses
+            ],
+            on_conflict="email_id",
+        )
+    )
+    return response.data
+
+
+async def update_priority(email_id: str, priority_score: int) -> None:
+    await execute(
+        _table("email_analysis")
+        .update({"priority_score": priority_score})
+        .eq("email_id", email_id)
+    )
+
+
+# User preferences
+
+
+async def get_preferences(user_id: str) -> Optional[dict]:
+    """Get the user's preferences row, served from the per-user cache when possible."""
+    cached = preferences_cache.get(user_id)
+    if cached is not None:
+        return dict(cached)
+
+    response = await execute(
+        _table("user_preferences").select("*").eq("user_id", user_id)
+    )
+    if not response.data:
+        return None
+
+    preferences_cache.set(user_id, response.data[0])
+    return dict(response.data[0])
+
+
+async def create_preferences(user_id: str) -> dict:
+    response = await execute(
+        _table("user_preferences").insert(
+            {
+                "user_id": user_id,
+                "vip_contacts": [],
+                "vip_domains": [],
+            }
+        )
+    )
+    return response.data[0]
+
+
+async def upsert_preferences(user_id: str, update_data: dict) -> dict:
+    response = await execute(
+        _table("user_preferences").upsert(
+            {
+                "user_id": user_id,
+                **update_data,
+            },
+            on_conflict="user_id",
+        )
+    )
+    return response.data[0]
+
+
+async def get_emails(email_ids: list[str], account_ids: list[str]) -> list[dict]:
+    """Emails with their analysis by id, in no particular order."""
+    response = await execute(
+        _table("emails")
+        .select(DETAIL_SELECT)
+        .in_("id", email_ids)
+        .in_("account_id", account_ids)
+    )
+    return response.data
+
+
+# Search
+
+
+async def search_email_text(
+    account_ids: list[str], query: str, limit: int, offset: int
+) -> list[dict]:
+    """Ids and ranks of emails matching a full-text query, best first."""
+    response = await execute(
+        get_supabase_admin().rpc(
+            "search_emails",
+            {
+                "p_account_ids": account_ids,
+                "p_query": query,
+                "p_limit": limit,
+                "p_offset": offset,
+            },
+        )
+    )
+    return response.data
+
+
+async def match_email_embeddings(
+    account_ids: list[str], embedding: list[float], limit: int, offset: int
+) -> list[dict]:
+    """Ids and similarities of the emails nearest to an embedding, best first."""
+    response = await execute(
+        get_supabase_admin().rpc(
+            "match_emails",
+            {
+                "p_account_ids": account_ids,
+                "p_embedding": embedding,
+                "p_limit": limit,
+                "p_offset": offset,
+            },
+        )
+    )
+    return response.data
+
+
+async def upsert_embeddings(rows: list[dict]) -> None:
+    if not rows:
+        return
+
+    await execute(_table("email_embeddings").upsert(rows, on_conflict="email_id"))
+
+
+# Thread state
+
+
+async def get_thread_states(account_id: str, thread_ids: list[str]) -> list[dict]:
+    if not thread_ids:
+        return []
+
+    response = await execute(
+        _table("thread_state")
+        .select("thread_id, subject, summary, priority_score, message_count")
+        .eq("account_id", account_id)
+        .in_("thread_id", thread_ids)
+    )
+    return response.data
+
+
+async def upsert_thread_states(states: list[dict]) -> None:
+    if not states:
+        return
+
+    await execute(
+        _table("thread_state").upsert(states, on_conflict="account_id,thread_id")
+    )
+
+
+async def list_threads(
+    account_ids: list[str],
+    min_priority: Optional[int] = None,
+    limit: int = 50,
+    offset: int = 0,
+) -> list[dict]:
+    """One row per thread, highest priority first, then most recent."""
+    query = (
+        _table("thread_state")
+        .select(
+            "account_id, thread_id, subject, summary, priority_score, "
+            "message_count, last_email_id, last_sender_email, last_received_at"
+        )
+        .in_("account_id", account_ids)
+    )
+    if min_priority is not None:
+        query = query.gte("priority_score", min_priority)
+
+    response = await execute(
+        query.order("priority_score", desc=True)
+        .order("last_received_at", desc=True)
+        .range(offset, offset + limit - 1)
+    )
+    return response.data
+
+
+# Priority feedback
+
+
+async def insert_feedback(feedback: dict) -> None:
+    await execute(_table("priority_feedback").insert(feedback))
+
+
+async def get_priority_model(user_id: str) -> Optional[dict]:
+    response = await execute(
+        _table("user_priority_models").select("*").eq("user_id", user_id)
+    )
+    return response.data[0] if response.data else None
+
+
+async def upsert_priority_model(user_id: str, model: dict) -> None:
+    await execute(
+        _table("user_priority_models").upsert(
+            {
+                "user_id": user_id,
+                **model,
+                "updated_at": datetime.now(timezone.utc).isoformat(),
+            },
+            on_conflict="user_id",
+        )
+    )
+
+
+# Sender stats
+
+
+async def get_sender_stats(user_id: str) -> list[dict]:
+    response = await execute(
+        _table("sender_stats")
+        .select("sender_email, email_count, mean_score, last_seen_at")
+        .eq("user_id", user_id)
+    )
+    return response.data
+
+
+async def record_sender_scores(
+    user_id: str, senders: list[str], scores: list[int]
+) -> None:
+    """Fold new scores into the rolling sender stats in one atomic call."""
+    await execute(
+        get_supabase_admin().rpc(
+            "record_sender_scores",
+            {"p_user_id": user_id, "p_senders": senders, "p_scores": scores},
+        )
+    )
+
+
+# Backfill jobs
+
+
+async def create_backfill_job(job: dict) -> dict:
+    response = await execute(_table("backfill_jobs").insert(job))
+    return response.data[0]
+
+
+async def get_backfill_job(account_id: str) -> Optional[dict]:
+    """The account's most recent backfill job."""
+    response = await execute(
+        _table("backfill_jobs")
+        .select("*")
+        .eq("account_id", account_id)
+        .order("created_at", desc=True)
+        .limit(1)
+    )
+    return response.data[0] if response.data else None
+
+
+async def list_running_backfill_jobs() -> list[dict]:
+    response = await execute(
+        _table("backfill_jobs").select("*").eq("status", "running")
+    )
+    return response.data
+
+
+async def update_backfill_job(job_id: str, fields: dict) -> None:
+    await execute(
+        _table("backfill_jobs")
+        .update({**fields, "updated_at": datetime.now(timezone.utc).isoformat()})
+        .eq("id", job_id)
+    )
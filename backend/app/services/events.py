@@ -0,0 +1,141 @@
+import asyncio
+from abc import ABC, abstractmethod
+from typing import Callable, Optional
+from app.config import get_settings
+from app.models.schemas import EmailWithAnalysis
+
+settings = get_settings()
+
+Deliver = Callable[[str, EmailWithAnalysis], None]
+
+
+class Broker(ABC):
+    """Carries published emails to every API worker's EmailEventHub.
+
+    The default LocalBroker only reaches subscribers in this process. For
+    multi-worker deployments, subclass Broker to publish over a shared
+    channel (Redis pub/sub, Postgres NOTIFY, ...) and call deliver() for
+    each message received, then pass it to set_event_broker() at startup.
+    """
+
+    _deliver: Optional[Deliver] = None
+
+    async def start(self, deliver: Deliver) -> None:
+        self._deliver = deliver
+
+    async def stop(self) -> None:
+        pass
+
+    @abstractmethod
+    async def publish(self, user_id: str, email: EmailWithAnalysis) -> None:
+        """Send an email to every worker's hub for delivery."""
+
+
+class LocalBroker(Broker):
+    """In-process broker: published emails go straight to local subscribers."""
+
+    async def publish(self, user_id: str, email: EmailWithAnalysis) -> None:
+        # Nothing is subscribed before the hub has started
+        if self._deliver is not None:
+            self._deliver(user_id, email)
+
+
+class Subscription:
+    """One connected client's bounded queue of emails at or above threshold."""
+
+    def __init__(self, user_id: str, threshold: int, queue_size: int):
+        self.user_id = user_id
+        self.threshold = threshold
+        self.queue: asyncio.Queue[EmailWithAnalysis] = asyncio.Queue(queue_size)
+        self.overflowed = False
+
+    def offer(self, email: EmailWithAnalysis) -> bool:
+        """Queue the email, or mark the subscription overflowed if full."""
+        try:
+            self.queue.put_nowait(email)
+            return True
+        except asyncio.QueueFull:
+            self.overflowed = True
+            return False
+
+    async def get(self, timeout: float) -> Optional[EmailWithAnalysis]:
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class EmailEventHub:
+    """Fans newly analyzed emails out to the user's connected streams.
+
+    Each subscription has a bounded queue. A client that falls behind and
+    fills its queue is marked overflowed and disconnected rather than
+    buffering without limit or slowing down the sync pipeline; it can
+    reconnect and catch up through the email feed.
+    """
+
+    def __init__(self, queue_size: int, broker: Optional[Broker] = None):
+        self.queue_size = queue_size
+        self.broker = broker or LocalBroker()
+        self._subscriptions: dict[str, set[Subscription]] = {}
+        self.published = 0
+        self.delivered = 0
+        self.overflows = 0
+
+    async def start(self) -> None:
+        await self.broker.start(self._deliver)
+
+    async def stop(self) -> None:
+        await self.broker.stop()
+
+    def subscribe(self, user_id: str, threshold: int) -> Subscription:
+        subscription = Subscription(user_id, threshold, self.queue_size)
+        self._subscriptions.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscriptions = self._subscriptions.get(subscription.user_id)
+        if subscriptions is None:
+            return
+        subscriptions.discard(subscription)
+        if not subscriptions:
+            del self._subscriptions[subscription.user_id]
+
+    async def publish(self, user_id: str, emails: list[EmailWithAnalysis]) -> None:
+        for email in emails:
+            self.published += 1
+            await self.broker.publish(user_id, email)
+
+    def _deliver(self, user_id: str, email: EmailWithAnalysis) -> None:
+        score = email.analysis.priority_score if email.analysis else None
+        if score is None:
+            return
+
+        for subscription in list(self._subscriptions.get(user_id, ())):
+            if subscription.overflowed or score < subscription.threshold:
+                continue
+            if subscription.offer(email):
+                self.delivered += 1
+            else:
+                self.overflows += 1
+
+    def stats(self) -> dict:
+        return {
+            "broker": type(self.broker).__name__,
+            "subscribers": sum(len(s) for s in self._subscriptions.values()),
+            "published": self.published,
+            "delivered": self.delivered,
+            "overflows": self.overflows,
+        }
+
+
+event_hub = EmailEventHub(queue_size=settings.stream_queue_size)
+
+
+def get_event_hub() -> EmailEventHub:
+    return event_hub
+
+
+def set_event_broker(broker: Broker) -> None:
+    """Replace the broker; call before the app starts."""
+    event_hub.broker = broker
@@ -0,0 +1,97 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+from app.config import get_settings
+
+settings = get_settings()
+
+
+class BlockingExecutor:
+    """Dedicated thread pool for blocking SDK calls, with usage metrics.
+
+    Supabase, Gmail and other synchronous clients are routed through here so
+    they never run on the event loop, and so the pool can be sized
+    separately from asyncio's default executor.
+    """
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="blocking"
+        )
+        self._lock = threading.Lock()
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._in_flight = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._run_total = 0.0
+        self._run_max = 0.0
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run fn(*args, **kwargs) in the pool and await its result."""
+        submitted_at = time.perf_counter()
+        with self._lock:
+            self._submitted += 1
+
+        def call():
+            started_at = time.perf_counter()
+            with self._lock:
+                self._in_flight += 1
+                wait = started_at - submitted_at
+                self._wait_total += wait
+                self._wait_max = max(self._wait_max, wait)
+
+            failed = False
+            try:
+                return fn(*args, **kwargs)
+            except BaseException:
+                failed = True
+                raise
+            finally:
+                elapsed = time.perf_counter() - started_at
+                with self._lock:
+                    self._in_flight -= 1
+                    self._run_total += elapsed
+                    self._run_max = max(self._run_max, elapsed)
+                    if failed:
+                        self._failed += 1
+                    else:
+                        self._completed += 1
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, call)
+
+    def stats(self) -> dict:
+        with self._lock:
+            finished = self._completed + self._failed
+            return {
+                "max_workers": self.max_workers,
+                "submitted": self._submitted,
+                "completed": self._completed,
+                "failed": self._failed,
+                "in_flight": self._in_flight,
+                "queued": self._submitted - finished - self._in_flight,
+                "avg_wait_ms": round(1000 * self._wait_total / finished, 2) if finished else 0.0,
+                "max_wait_ms": round(1000 * self._wait_max, 2),
+                "avg_run_ms": round(1000 * self._run_total / finished, 2) if finished else 0.0,
+                "max_run_ms": round(1000 * self._run_max, 2),
+            }
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+executor = BlockingExecutor(max_workers=settings.blocking_pool_size)
+
+
+def get_executor() -> BlockingExecutor:
+    return executor
+
+
+async def run_blocking(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run a blocking call on the shared blocking executor."""
+    return await executor.run(fn, *args, **kwargs)
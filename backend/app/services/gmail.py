@@ -1,14 +1,34 @@
-import base64
-from datetime import datetime, timezone
+import random
+import time
+from datetime import datetime, timedelta, timezone
 from typing import Optional
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import Flow
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
 from app.config import get_settings
 from app.models.schemas import EmailCreate
+from app.services.mime import extract_body_text
+from app.services.prescorer import SIGNAL_HEADERS
 
 settings = get_settings()
 
+# Gmail accepts at most 100 calls per batch request.
+MAX_BATCH_SIZE = 100
+BATCH_MAX_RETRIES = 5
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+# Headers requested for metadata-only triage fetches; covers parse_email
+# and the pre-scorer's SIGNAL_HEADERS
+METADATA_HEADERS = [
+    "From",
+    "Subject",
+    "List-Unsubscribe",
+    "List-Id",
+    "Precedence",
+    "Auto-Submitted",
+]
+
 SCOPES = [
     "https://www.googleapis.com/auth/gmail.readonly",
     "https://www.googleapis.com/auth/gmail.modify",
@@ -58,16 +78,34 @@ def exchange_code_for_tokens(code: str) -> dict:
     }
 
 
-def get_gmail_service(access_token: str, refresh_token: str):
-    """Create Gmail API service instance."""
-    credentials = Credentials(
+def get_credentials(
+    access_token: str, refresh_token: str, expiry: Optional[datetime] = None
+) -> Credentials:
+    """Create OAuth credentials for a Gmail account."""
+    return Credentials(
         token=access_token,
         refresh_token=refresh_token,
         token_uri="https://oauth2.googleapis.com/token",
         client_id=settings.google_client_id,
         client_secret=settings.google_client_secret,
+        expiry=expiry,
     )
-    return build("gmail", "v1", credentials=credentials)
+
+
+def build_gmail_service(credentials: Credentials):
+    """Build a Gmail API service from the bundled static discovery document."""
+    return build(
+        "gmail",
+        "v1",
+        credentials=credentials,
+        static_discovery=True,
+        cache_discovery=False,
+    )
+
+
+def get_gmail_service(access_token: str, refresh_token: str):
+    """Create Gmail API service instance."""
+    return build_gmail_service(get_credentials(access_token, refresh_token))
 
 
 def get_user_email(service) -> str:
@@ -77,9 +115,12 @@ def get_user_email(service) -> str:
 
 
 def fetch_emails(
-    service, max_results: int = 50, page_token: Optional[str] = None
+    service,
+    max_results: int = 50,
+    page_token: Optional[str] = None,
+    query: Optional[str] = None,
 ) -> tuple[list[dict], Optional[str]]:
-    """Fetch emails from Gmail inbox."""
+    """Fetch emails from Gmail inbox, optionally filtered by a Gmail search query."""
     results = (
         service.users()
         .messages()
@@ -88,6 +129,7 @@ def fetch_emails(
             maxResults=max_results,
             pageToken=page_token,
             labelIds=["INBOX"],
+            q=query,
         )
         .execute()
     )
@@ -98,6 +140,152 @@ def fetch_emails(
     return messages, next_page_token
 
 
+def get_inbox_total(service) -> int:
+    """Number of messages in the inbox."""
+    label = service.users().labels().get(userId="me", id="INBOX").execute()
+    return label["messagesTotal"]
+
+
+def watch_mailbox(service, topic_name: str) -> dict:
+    """Register Gmail push notifications for the inbox on a Pub/Sub topic.
+
+    Returns Gmail's response with the current historyId and the watch
+    expiration (epoch milliseconds). Watches last at most 7 days.
+    """
+    return (
+        service.users()
+        .watch(
+            userId="me",
+            body={
+                "topicName": topic_name,
+                "labelIds": ["INBOX"],
+                "labelFilterBehavior": "INCLUDE",
+            },
+        )
+        .execute()
+    )
+
+
+def get_history_id(service) -> str:
+    """Get the mailbox's current history ID to use as a sync checkpoint."""
+    profile = service.users().getProfile(userId="me").execute()
+    return profile["historyId"]
+
+
+class HistoryExpiredError(Exception):
+    """Raised when a stored history ID is too old for users.history.list."""
+
+
+def fetch_history(
+    service,
+    start_history_id: str,
+    label_id: str = "INBOX",
+    max_messages: Optional[int] = None,
+) -> tuple[list[dict], str]:
+    """Fetch messages added since start_history_id.
+
+    Returns the added message refs (oldest first, de-duplicated) and the
+    history ID to store for the next incremental sync. With max_messages,
+    stops at the first history record boundary past that many messages and
+    returns that record's ID, so the next sync picks up where this one
+    stopped. Raises HistoryExpiredError if Gmail no longer has history that
+    far back.
+    """
+    messages: list[dict] = []
+    seen: set[str] = set()
+    history_id = start_history_id
+    page_token = None
+
+    while True:
+        try:
+            results = (
+                service.users()
+                .history()
+                .list(
+                    userId="me",
+                    startHistoryId=start_history_id,
+                    historyTypes=["messageAdded"],
+                    labelId=label_id,
+                    pageToken=page_token,
+                )
+                .execute()
+            )
+        except HttpError as e:
+            if e.resp.status == 404:
+                raise HistoryExpiredError(start_history_id) from e
+            raise
+
+        for record in results.get("history", []):
+            for added in record.get("messagesAdded", []):
+                msg = added["message"]
+                if msg["id"] in seen:
+                    continue
+                seen.add(msg["id"])
+                messages.append(msg)
+            if max_messages is not None and len(messages) >= max_messages:
+                return messages, record["id"]
+
+        history_id = results.get("historyId", history_id)
+        page_token = results.get("nextPageToken")
+        if not page_token:
+            break
+
+    return messages, history_id
+
+
+# Gmail's after: compares against its internal date; overlap the previous
+# sync by this much so clock skew can't open a gap (stored ids are skipped)
+RESYNC_OVERLAP = timedelta(hours=1)
+
+# Page size when listing every message since the last sync
+LIST_PAGE_SIZE = 500
+
+
+def list_messages_since(service, since: datetime) -> list[dict]:
+    """List refs of all inbox messages received after since, newest first."""
+    query = f"after:{int((since - RESYNC_OVERLAP).timestamp())}"
+    messages: list[dict] = []
+    page_token = None
+    while True:
+        page, page_token = fetch_emails(service, LIST_PAGE_SIZE, page_token, query)
+        messages.extend(page)
+        if not page_token:
+            return messages
+
+
+def fetch_new_emails(
+    service,
+    history_id: Optional[str],
+    max_results: int = 30,
+    max_history_messages: Optional[int] = None,
+    last_sync_at: Optional[datetime] = None,
+) -> tuple[list[dict], str, bool]:
+    """Fetch message refs to sync, incrementally when a history ID is known.
+
+    When there is no stored history ID or it has expired, lists every inbox
+    message since last_sync_at, or just the newest max_results for an
+    account that has never synced. Returns the message refs, the history ID
+    to store, and whether a full resync was performed.
+    """
+    if history_id:
+        try:
+            messages, new_history_id = fetch_history(
+                service, history_id, max_messages=max_history_messages
+            )
+            return messages, new_history_id, False
+        except HistoryExpiredError:
+            pass
+
+    # Capture the checkpoint before listing so nothing arriving in between
+    # is missed by the next incremental sync.
+    new_history_id = get_history_id(service)
+    if last_sync_at:
+        messages = list_messages_since(service, last_sync_at)
+    else:
+        messages, _ = fetch_emails(service, max_results=max_results)
+    return messages, new_history_id, True
+
+
 def get_email_details(service, message_id: str) -> dict:
     """Get full email details including body."""
     message = (
@@ -109,8 +297,96 @@ def get_email_details(service, message_id: str) -> dict:
     return message
 
 
-def parse_email(message: dict, account_id: str) -> EmailCreate:
-    """Parse Gmail message into EmailCreate schema."""
+def _is_retryable(error: HttpError) -> bool:
+    """Return True for rate-limit and transient server errors."""
+    status_code = error.resp.status
+    if status_code in RETRYABLE_STATUSES:
+        return True
+    # Gmail reports per-user rate limits as 403 with a rateLimitExceeded reason
+    return status_code == 403 and b"ateLimitExceeded" in (error.content or b"")
+
+
+class BatchFetchError(Exception):
+    """Raised when some messages in a batch fetch could not be retrieved."""
+
+    def __init__(self, message_ids: list[str]):
+        super().__init__(f"Failed to fetch {len(message_ids)} message(s) from Gmail")
+        self.message_ids = message_ids
+
+
+def get_email_details_batch(
+    service,
+    message_ids: list[str],
+    batch_size: int = MAX_BATCH_SIZE,
+    format: str = "full",
+) -> list[dict]:
+    """Get details for many emails using Gmail batch requests.
+
+    Groups up to batch_size message gets into one HTTP request and retries
+    rate-limited items with exponential backoff. Messages are returned in the
+    order of message_ids; messages that no longer exist (404) are omitted.
+    Raises BatchFetchError if any other message still fails after retries,
+    so callers don't advance their sync checkpoint past it.
+    format="metadata" fetches only labels, snippet and the METADATA_HEADERS,
+    without any body parts.
+    """
+    get_kwargs = {"format": format}
+    if format == "metadata":
+        get_kwargs["metadataHeaders"] = METADATA_HEADERS
+
+    batch_size = max(1, min(batch_size, MAX_BATCH_SIZE))
+    message_ids = list(dict.fromkeys(message_ids))
+    results: dict[str, dict] = {}
+    failed: list[str] = []
+
+    for start in range(0, len(message_ids), batch_size):
+        pending = message_ids[start : start + batch_size]
+
+        for attempt in range(BATCH_MAX_RETRIES + 1):
+            retry: list[str] = []
+
+            def callback(request_id, response, exception):
+                if exception is None:
+                    results[request_id] = response
+                elif isinstance(exception, HttpError) and exception.resp.status == 404:
+                    # Deleted since it was listed
+                    pass
+                elif isinstance(exception, HttpError) and _is_retryable(exception):
+                    retry.append(request_id)
+                else:
+                    failed.append(request_id)
+
+            batch = service.new_batch_http_request(callback=callback)
+            for message_id in pending:
+                batch.add(
+                    service.users()
+                    .messages()
+                    .get(userId="me", id=message_id, **get_kwargs),
+                    request_id=message_id,
+                )
+            batch.execute()
+
+            if not retry:
+                break
+            if attempt == BATCH_MAX_RETRIES:
+                failed.extend(retry)
+                break
+
+            pending = retry
+            time.sleep(min(32, 2**attempt) + random.random())
+
+    if failed:
+        raise BatchFetchError(failed)
+
+    return [results[message_id] for message_id in message_ids if message_id in results]
+
+
+def parse_email(message: dict, account_id: str, with_body: bool = True) -> EmailCreate:
+    """Parse Gmail message into EmailCreate schema.
+
+    Pass with_body=False for metadata-only messages; their body_text is
+    None (not fetched) rather than "" (empty).
+    """
     headers = {h["name"].lower(): h["value"] for h in message["payload"]["headers"]}
 
     from_header = headers.get("from", "")
@@ -121,7 +397,7 @@ def parse_email(message: dict, account_id: str) -> EmailCreate:
         sender_name = from_header.split("<")[0].strip().strip('"')
         sender_email = from_header.split("<")[1].split(">")[0]
 
-    body_text = extract_body_text(message["payload"])
+    body_text = extract_body_text(message["payload"]) if with_body else None
 
     internal_date = int(message.get("internalDate", 0))
     received_at = datetime.fromtimestamp(internal_date / 1000, tz=timezone.utc)
@@ -138,25 +414,7 @@ def parse_email(message: dict, account_id: str) -> EmailCreate:
         received_at=received_at,
         is_read="UNREAD" not in message.get("labelIds", []),
         labels=message.get("labelIds", []),
+        signal_headers={
+            name: headers[name] for name in SIGNAL_HEADERS if name in headers
+        },
     )
-
-
-def extract_body_text(payload: dict) -> str:
-    """Extract plain text body from email payload."""
-    body_text = ""
-
-    if "body" in payload and payload["body"].get("data"):
-        body_text = base64.urlsafe_b64decode(payload["body"]["data"]).decode("utf-8")
-    elif "parts" in payload:
-        for part in payload["parts"]:
-            if part["mimeType"] == "text/plain" and part["body"].get("data"):
-                body_text = base64.urlsafe_b64decode(part["body"]["data"]).decode(
-                    "utf-8"
-                )
-                break
-            elif part["mimeType"] == "multipart/alternative":
-                body_text = extract_body_text(part)
-                if body_text:
-                    break
-
-    return body_text[:10000] if body_text else ""  # Limit body size
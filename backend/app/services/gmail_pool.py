@@ -0,0 +1,165 @@
+import asyncio
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from google.auth.transport.requests import Request
+from app.config import get_settings
+from app.services.executor import run_blocking
+from app.services.gmail import build_gmail_service, get_credentials
+
+settings = get_settings()
+
+# Refresh access tokens this long before they expire
+REFRESH_MARGIN = timedelta(minutes=5)
+
+
+def _parse_expiry(value) -> Optional[datetime]:
+    """Convert a stored token_expiry to the naive UTC datetime google-auth uses."""
+    if not value:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+class _PooledService:
+    def __init__(self, service, credentials, persisted_token: str):
+        self.service = service
+        self.credentials = credentials
+        self.persisted_token = persisted_token
+        self.last_used = time.monotonic()
+
+
+class GmailServicePool:
+    """Reusable Gmail API services and credentials, keyed by account id.
+
+    Services are built once from the static discovery document and keep
+    their HTTP connections open between syncs. A service is leased to one
+    caller at a time (httplib2 is not thread-safe); concurrent callers for
+    the same account get an extra instance. Access tokens are refreshed
+    ahead of expiry, and release() reports tokens that changed so callers
+    can persist them. Async callers lease through lease(), which also caps
+    how many services are in use at once across all accounts.
+    """
+
+    def __init__(self, idle_timeout: float, max_leases: int):
+        self.idle_timeout = idle_timeout
+        self.max_leases = max_leases
+        self._slots = asyncio.Semaphore(max_leases)
+        self._idle: dict[str, _PooledService] = {}
+        self._leased: dict[int, tuple[str, _PooledService]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.builds = 0
+        self.refreshes = 0
+        self.evictions = 0
+
+    def acquire(self, account: dict):
+        """Lease a ready-to-use Gmail service for the account.
+
+        Blocking: may build a service or refresh the access token.
+        """
+        with self._lock:
+            self._evict_idle()
+            entry = self._idle.pop(account["id"], None)
+
+        if entry and entry.credentials.refresh_token != account["refresh_token"]:
+            # The account was reconnected with new credentials
+            entry = None
+
+        if not entry:
+            credentials = get_credentials(
+                account["access_token"],
+                account["refresh_token"],
+                _parse_expiry(account.get("token_expiry")),
+            )
+            entry = _PooledService(
+                build_gmail_service(credentials), credentials, account["access_token"]
+            )
+            built = True
+        else:
+            built = False
+
+        expiry = entry.credentials.expiry
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        refreshed = expiry is None or expiry - REFRESH_MARGIN <= now
+        if refreshed:
+            entry.credentials.refresh(Request())
+
+        with self._lock:
+            self._leased[id(entry.service)] = (account["id"], entry)
+            self.builds += built
+            self.hits += not built
+            self.refreshes += refreshed
+        return entry.service
+
+    async def lease(self, account: dict):
+        """Wait for a free slot, then acquire a service off the event loop."""
+        await self._slots.acquire()
+        try:
+            return await run_blocking(self.acquire, account)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, service) -> Optional[dict]:
+        """Return a service leased with lease() to the pool.
+
+        Returns the email_accounts fields to update if its access token was
+        refreshed since it was last persisted, otherwise None.
+        """
+        self._slots.release()
+        with self._lock:
+            account_id, entry = self._leased.pop(id(service))
+            entry.last_used = time.monotonic()
+            if account_id not in self._idle:
+                self._idle[account_id] = entry
+
+        credentials = entry.credentials
+        if credentials.token == entry.persisted_token:
+            return None
+
+        entry.persisted_token = credentials.token
+        update = {"access_token": credentials.token}
+        if credentials.expiry:
+            update["token_expiry"] = credentials.expiry.replace(
+                tzinfo=timezone.utc
+            ).isoformat()
+        return update
+
+    def evict(self, account_id: str) -> None:
+        """Drop the pooled service for an account, e.g. on disconnect."""
+        with self._lock:
+            if self._idle.pop(account_id, None):
+                self.evictions += 1
+
+    def _evict_idle(self) -> None:
+        cutoff = time.monotonic() - self.idle_timeout
+        for account_id in [a for a, e in self._idle.items() if e.last_used < cutoff]:
+            del self._idle[account_id]
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "idle": len(self._idle),
+                "leased": len(self._leased),
+                "max_leases": self.max_leases,
+                "hits": self.hits,
+                "builds": self.builds,
+                "refreshes": self.refreshes,
+                "evictions": self.evictions,
+            }
+
+
+gmail_pool = GmailServicePool(
+    idle_timeout=settings.gmail_pool_idle_seconds,
+    max_leases=settings.gmail_max_concurrency,
+)
+
+
+def get_gmail_pool() -> GmailServicePool:
+    return gmail_pool
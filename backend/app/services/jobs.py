@@ -0,0 +1,133 @@
+import asyncio
+import uuid
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from typing import Optional
+from app.config import get_settings
+from app.models.schemas import SyncJob
+from app.services import db
+from app.services.sync import sync_account
+
+settings = get_settings()
+
+# Finished jobs kept around so clients can poll their final status
+MAX_FINISHED_JOBS = 1000
+
+
+class SyncJobQueue:
+    """In-process sync job queue served by a pool of worker tasks.
+
+    At most one job per account is queued or running at a time; enqueueing
+    a sync for an account that already has one returns the existing job.
+    Queued jobs are served round-robin across users, so a user with many
+    accounts can't starve others, and each job is capped at
+    sync_max_messages_per_job so one busy mailbox can't hold a worker for long.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        # Queued job ids per user, in the order users are next served
+        self._queued: OrderedDict[str, deque[str]] = OrderedDict()
+        self._ready = asyncio.Semaphore(0)
+        self._jobs: OrderedDict[str, SyncJob] = OrderedDict()
+        self._active: dict[str, str] = {}
+        self._tasks: list[asyncio.Task] = []
+
+    def start(self) -> None:
+        for _ in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._worker()))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    def enqueue(
+        self, account_id: str, user_id: str, follow_up: bool = False
+    ) -> SyncJob:
+        """Queue a sync for the account, or return its pending job.
+
+        With follow_up, a job that is already running is marked to be
+        followed by another sync once it finishes, since it may have read
+        the account's history before the change that prompted this call.
+        """
+        active_id = self._active.get(account_id)
+        if active_id:
+            job = self._jobs[active_id]
+            if follow_up and job.status == "running":
+                job.rerun_requested = True
+            return job
+
+        job = SyncJob(
+            id=str(uuid.uuid4()),
+            account_id=account_id,
+            user_id=user_id,
+            status="queued",
+            created_at=datetime.now(timezone.utc),
+        )
+        self._jobs[job.id] = job
+        self._active[account_id] = job.id
+        self._queued.setdefault(user_id, deque()).append(job.id)
+        self._ready.release()
+        return job
+
+    def get(self, job_id: str) -> Optional[SyncJob]:
+        return self._jobs.get(job_id)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "queued": sum(len(jobs) for jobs in self._queued.values()),
+            "queued_users": len(self._queued),
+            "active": len(self._active),
+        }
+
+    def _next(self) -> str:
+        """Take the next user's oldest job and move that user to the back."""
+        user_id, job_ids = self._queued.popitem(last=False)
+        job_id = job_ids.popleft()
+        if job_ids:
+            self._queued[user_id] = job_ids
+        return job_id
+
+    async def _worker(self) -> None:
+        while True:
+            await self._ready.acquire()
+            await self._run(self._jobs[self._next()])
+
+    async def _run(self, job: SyncJob) -> None:
+        job.status = "running"
+        job.started_at = datetime.now(timezone.utc)
+
+        try:
+            account = await db.get_account(job.account_id)
+            if not account:
+                raise LookupError("Account not found")
+            await sync_account(account, job)
+            job.status = "completed"
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)[:200]
+        finally:
+            job.finished_at = datetime.now(timezone.utc)
+            self._active.pop(job.account_id, None)
+            if job.rerun_requested:
+                self.enqueue(job.account_id, job.user_id)
+            self._prune()
+
+    def _prune(self) -> None:
+        finished = [
+            job_id
+            for job_id, job in self._jobs.items()
+            if job.status in ("completed", "failed")
+        ]
+        for job_id in finished[: max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job_id]
+
+
+sync_queue = SyncJobQueue(workers=settings.sync_workers)
+
+
+def get_sync_queue() -> SyncJobQueue:
+    return sync_queue
@@ -0,0 +1,133 @@
+import asyncio
+import random
+from openai import (
+    AsyncOpenAI,
+    APIConnectionError,
+    APIStatusError,
+    RateLimitError,
+)
+from app.config import get_settings
+from app.services.rate_limit import TokenBucket
+
+settings = get_settings()
+
+# Rough prompt size estimate used for tokens/min accounting before a call
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(messages: list[dict], max_tokens: int) -> int:
+    """Estimate the tokens a chat completion will consume."""
+    chars = sum(len(m["content"]) for m in messages)
+    return chars // CHARS_PER_TOKEN + max_tokens
+
+
+class LLMEngine:
+    """Async OpenAI client with bounded concurrency, rate limiting and retries.
+
+    Concurrency is capped by a semaphore, request and token throughput by
+    token buckets sized from the account's per-minute limits, and 429/5xx
+    responses are retried with jittered exponential backoff.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        model: str,
+        max_concurrency: int,
+        requests_per_minute: int,
+        tokens_per_minute: int,
+        max_retries: int,
+    ):
+        self.client = AsyncOpenAI(api_key=api_key, max_retries=0)
+        self.model = model
+        self.max_retries = max_retries
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._requests = TokenBucket(requests_per_minute)
+        self._tokens = TokenBucket(tokens_per_minute)
+
+    async def complete(
+        self,
+        messages: list[dict],
+        max_tokens: int = 500,
+        temperature: float = 0.3,
+    ) -> str:
+        """Run a chat completion and return the stripped message content."""
+        estimated = estimate_tokens(messages, max_tokens)
+
+        async def call():
+            return await self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+            )
+
+        response = await self._call(call, estimated)
+        return response.choices[0].message.content.strip()
+
+    async def embed(self, texts: list[str], model: str, dimensions: int) -> list[list[float]]:
+        """Embed texts in one request, returning vectors in input order."""
+        estimated = sum(len(text) for text in texts) // CHARS_PER_TOKEN
+
+        async def call():
+            return await self.client.embeddings.create(
+                model=model, input=texts, dimensions=dimensions
+            )
+
+        response = await self._call(call, estimated)
+        return [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+
+    async def _call(self, call, estimated: int):
+        """Run an API call under the limiters, retrying transient failures."""
+        attempt = 0
+        while True:
+            await self._requests.acquire()
+            await self._tokens.acquire(estimated)
+
+            try:
+                async with self._semaphore:
+                    response = await call()
+            except (RateLimitError, APIConnectionError, APIStatusError) as e:
+                if attempt >= self.max_retries or not _is_retryable(e):
+                    raise
+                await asyncio.sleep(_backoff_delay(e, attempt))
+                attempt += 1
+                continue
+
+            if response.usage:
+                self._tokens.refund(estimated - response.usage.total_tokens)
+
+            return response
+
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, (RateLimitError, APIConnectionError)):
+        return True
+    return isinstance(error, APIStatusError) and error.status_code >= 500
+
+
+def _backoff_delay(error: Exception, attempt: int) -> float:
+    """Full-jitter exponential backoff, honoring Retry-After when present."""
+    response = getattr(error, "response", None)
+    if response is not None:
+        retry_after = response.headers.get("retry-after")
+        if retry_after:
+            try:
+                return float(retry_after) + random.random()
+            except ValueError:
+                pass
+    return random.uniform(0, min(30.0, 2**attempt))
+
+
+engine = LLMEngine(
+    api_key=settings.openai_api_key,
+    model=settings.openai_model,
+    max_concurrency=settings.llm_max_concurrency,
+    requests_per_minute=settings.llm_requests_per_minute,
+    tokens_per_minute=settings.llm_tokens_per_minute,
+    max_retries=settings.llm_max_retries,
+)
+
+
+def get_llm_engine() -> LLMEngine:
+    return engine
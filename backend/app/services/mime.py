@@ -0,0 +1,165 @@
+import base64
+import codecs
+import re
+from html.parser import HTMLParser
+from typing import Iterator, Optional
+
+# Longest body text kept per email
+MAX_BODY_CHARS = 10000
+
+# base64 characters decoded per step (multiples of 4, so steps stay aligned).
+# HTML parsing is far slower than decoding, so HTML is fed in smaller steps.
+DECODE_CHUNK_CHARS = 64 * 1024
+HTML_CHUNK_CHARS = 8 * 1024
+
+CHARSET_RE = re.compile(r"""charset\s*=\s*["']?([^"';\s]+)""", re.IGNORECASE)
+BLANK_LINES_RE = re.compile(r"\n\s*\n\s*\n+")
+SPACES_RE = re.compile(r"[ \t\r\f\v]+")
+
+
+def _headers(part: dict) -> dict[str, str]:
+    return {h["name"].lower(): h["value"] for h in part.get("headers") or []}
+
+
+def part_charset(part: dict) -> str:
+    """The part's declared charset if Python knows it, else utf-8."""
+    match = CHARSET_RE.search(_headers(part).get("content-type", ""))
+    if match:
+        try:
+            return codecs.lookup(match.group(1)).name
+        except LookupError:
+            pass
+    return "utf-8"
+
+
+def _is_attachment(part: dict) -> bool:
+    if part.get("filename"):
+        return True
+    disposition = _headers(part).get("content-disposition", "")
+    return disposition.lower().startswith("attachment")
+
+
+def iter_text_parts(payload: dict) -> Iterator[dict]:
+    """Yield inline leaf parts with body data, in document order.
+
+    Walks the MIME tree with an explicit stack, so deeply nested
+    multipart/mixed, related and alternative trees are all covered.
+    """
+    stack = [payload]
+    while stack:
+        part = stack.pop()
+        children = part.get("parts")
+        if children:
+            stack.extend(reversed(children))
+        elif part.get("body", {}).get("data") and not _is_attachment(part):
+            yield part
+
+
+def iter_decoded(
+    data: str, charset: str, chunk_chars: int = DECODE_CHUNK_CHARS
+) -> Iterator[str]:
+    """Decode base64url body data to text a chunk at a time.
+
+    Invalid bytes for the charset are replaced rather than raising.
+    """
+    decoder = codecs.getincrementaldecoder(charset)(errors="replace")
+    data = data.strip()
+    for start in range(0, len(data), chunk_chars):
+        chunk = data[start : start + chunk_chars]
+        final = start + chunk_chars >= len(data)
+        if final:
+            chunk += "=" * (-len(chunk) % 4)
+        try:
+            raw = base64.urlsafe_b64decode(chunk)
+        except ValueError:
+            break
+        text = decoder.decode(raw, final=final)
+        if text:
+            yield text
+
+
+class _HTMLText(HTMLParser):
+    """Collects the visible text of an HTML document, fed incrementally."""
+
+    SKIP = {"script", "style", "head", "title", "noscript"}
+    BLOCK = {
+        "p", "div", "br", "tr", "li", "ul", "ol", "table", "section", "article",
+        "header", "footer", "h1", "h2", "h3", "h4", "h5", "h6", "blockquote", "hr",
+    }
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.chunks: list[str] = []
+        self.length = 0
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP:
+            self._skip_depth += 1
+        elif tag in self.BLOCK:
+            self._append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in self.BLOCK:
+            self._append("\n")
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self._append(data)
+
+    def _append(self, text: str) -> None:
+        self.chunks.append(text)
+        self.length += len(text)
+
+
+def _tidy(text: str) -> str:
+    text = SPACES_RE.sub(" ", text)
+    text = "\n".join(line.strip() for line in text.split("\n"))
+    return BLANK_LINES_RE.sub("\n\n", text).strip()
+
+
+def decode_text(part: dict, max_chars: int) -> str:
+    """Decode a text/plain part, stopping once max_chars are decoded."""
+    chunks: list[str] = []
+    length = 0
+    for text in iter_decoded(part["body"]["data"], part_charset(part)):
+        chunks.append(text)
+        length += len(text)
+        if length >= max_chars:
+            break
+    return "".join(chunks)[:max_chars]
+
+
+def decode_html(part: dict, max_chars: int) -> str:
+    """Convert a text/html part to text, stopping once max_chars are produced."""
+    parser = _HTMLText()
+    data = part["body"]["data"]
+    for html in iter_decoded(data, part_charset(part), HTML_CHUNK_CHARS):
+        parser.feed(html)
+        # Markup whitespace collapses, so read past the cap before tidying
+        if parser.length >= max_chars * 2:
+            break
+    parser.close()
+    return _tidy("".join(parser.chunks))[:max_chars]
+
+
+def extract_body_text(payload: dict, max_chars: int = MAX_BODY_CHARS) -> str:
+    """Extract the body of a Gmail message payload as text.
+
+    Uses the first inline text/plain part, or the first text/html part
+    converted to text when there is no plain part. At most max_chars are
+    returned, and decoding stops once they have been produced.
+    """
+    html_part: Optional[dict] = None
+    for part in iter_text_parts(payload):
+        mime_type = part.get("mimeType", "").lower()
+        if mime_type == "text/plain":
+            return decode_text(part, max_chars)
+        if mime_type == "text/html" and html_part is None:
+            html_part = part
+
+    if html_part is not None:
+        return decode_html(html_part, max_chars)
+    return ""
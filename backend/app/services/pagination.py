@@ -0,0 +1,62 @@
+import base64
+import json
+import uuid
+from datetime import datetime
+
+# Columns making up the keyset for each feed sort order, most significant first
+SORT_KEYS = {
+    "received_at": ["received_at", "id"],
+    "priority": ["priority_score", "received_at", "id"],
+}
+
+# Validate and canonicalize decoded cursor values per column
+_PARSERS = {
+    "priority_score": int,
+    "received_at": lambda v: datetime.fromisoformat(v).isoformat(),
+    "id": lambda v: str(uuid.UUID(v)),
+}
+
+
+def encode_cursor(sort: str, row: dict) -> str:
+    """Encode the sort key of the last row on a page as an opaque cursor."""
+    payload = {"s": sort, "k": [row[column] for column in SORT_KEYS[sort]]}
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str) -> dict:
+    """Decode a cursor into {column: value}; raises ValueError if invalid."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        values = list(payload["k"])
+    except Exception as e:
+        raise ValueError("Malformed cursor") from e
+
+    columns = SORT_KEYS[sort]
+    if payload.get("s") != sort or len(values) != len(columns):
+        raise ValueError("Cursor does not match the requested sort order")
+
+    # Values end up in a PostgREST filter, so only accept well-formed ones
+    try:
+        return {
+            column: _PARSERS[column](value) for column, value in zip(columns, values)
+        }
+    except (TypeError, ValueError) as e:
+        raise ValueError("Malformed cursor") from e
+
+
+def keyset_filter(after: dict) -> str:
+    """Build a PostgREST or= filter for rows strictly after `after` in descending order.
+
+    For keys (a, b, c) this is a < A or (a = A and b < B) or (a = A and b = B and c < C).
+    """
+    columns = list(after)
+    clauses = []
+    for i, column in enumerate(columns):
+        conditions = [f'{c}.eq."{after[c]}"' for c in columns[:i]]
+        conditions.append(f'{column}.lt."{after[column]}"')
+        clauses.append(
+            conditions[0] if len(conditions) == 1 else f"and({','.join(conditions)})"
+        )
+    return ",".join(clauses)
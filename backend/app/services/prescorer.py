@@ -0,0 +1,187 @@
+import re
+import threading
+from collections import Counter
+from typing import Optional
+from app.models.schemas import EmailAnalysisCreate
+from app.services.sender_index import SenderIndex
+
+# Headers kept from the Gmail payload for the pre-scorer (lowercase names)
+SIGNAL_HEADERS = ("list-unsubscribe", "list-id", "precedence", "auto-submitted")
+
+# Evidence that an email is bulk or automated, weighted by how reliable it is
+LABEL_WEIGHTS = {
+    "CATEGORY_PROMOTIONS": 3,
+    "CATEGORY_SOCIAL": 3,
+    "CATEGORY_FORUMS": 2,
+    "CATEGORY_UPDATES": 1,
+}
+HEADER_WEIGHTS = {
+    "list-unsubscribe": 2,
+    "list-id": 1,
+    "precedence": 2,
+    "auto-submitted": 2,
+}
+AUTOMATED_SENDER_WEIGHT = 3
+
+# Bulk weight at which an email is scored locally without urgent keywords,
+# and the weight at which urgent keywords are treated as marketing copy
+BULK_THRESHOLD = 3
+STRONG_BULK_THRESHOLD = 6
+
+BULK_SCORE = 10
+STRONG_BULK_URGENT_SCORE = 15
+
+# Senders whose past emails have consistently scored below this are scored
+# from their history once they have sent at least HISTORY_MIN_EMAILS
+HISTORY_LOW_SCORE = 20
+HISTORY_MIN_EMAILS = 5
+
+# Only the start of the body is scanned for urgent keywords
+URGENT_SCAN_CHARS = 2000
+
+AUTOMATED_SENDER_RE = re.compile(
+    r"(?:^|[._+-])(?:no-?reply|do-?not-?reply|notifications?|marketing|"
+    r"newsletters?|mailer-daemon|bounces?)(?:[._+-]|@)|unsubscribe|newsletter",
+    re.IGNORECASE,
+)
+URGENT_RE = re.compile(
+    r"\b(?:urgent|asap|immediately|deadline|overdue|past due|action required|"
+    r"response required|final notice|time.sensitive|by (?:today|tomorrow|eod)|"
+    r"end of (?:the )?day|eod)\b",
+    re.IGNORECASE,
+)
+BULK_PRECEDENCE = {"bulk", "list", "junk"}
+
+
+class PreScoreStats:
+    """Counts how many emails the pre-scorer handled versus deferred."""
+
+    def __init__(self):
+        self.scored = 0
+        self.deferred = 0
+        self.signals: Counter[str] = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, scored: bool, signals: list[str]) -> None:
+        with self._lock:
+            if scored:
+                self.scored += 1
+            else:
+                self.deferred += 1
+            self.signals.update(signals)
+
+    def stats(self) -> dict:
+        with self._lock:
+            evaluated = self.scored + self.deferred
+            return {
+                "evaluated": evaluated,
+                "scored": self.scored,
+                "deferred": self.deferred,
+                "handled_ratio": round(self.scored / evaluated, 4) if evaluated else 0.0,
+                "signals": dict(self.signals),
+            }
+
+
+prescore_stats = PreScoreStats()
+
+
+def prescorer_stats() -> dict:
+    return prescore_stats.stats()
+
+
+def bulk_signals(email: dict) -> list[str]:
+    """Names of the bulk/automated signals present on an email."""
+    signals = [label for label in email.get("labels") or [] if label in LABEL_WEIGHTS]
+
+    headers = email.get("signal_headers") or {}
+    for name in HEADER_WEIGHTS:
+        value = headers.get(name)
+        if value is None:
+            continue
+        value = value.strip().lower()
+        if name == "precedence" and value not in BULK_PRECEDENCE:
+            continue
+        if name == "auto-submitted" and value == "no":
+            continue
+        signals.append(name)
+
+    if AUTOMATED_SENDER_RE.search(email.get("sender_email") or ""):
+        signals.append("automated_sender")
+
+    return signals
+
+
+def _weight(signal: str) -> int:
+    if signal == "automated_sender":
+        return AUTOMATED_SENDER_WEIGHT
+    return LABEL_WEIGHTS.get(signal) or HEADER_WEIGHTS[signal]
+
+
+def has_urgent_keywords(subject: str, body_text: Optional[str]) -> bool:
+    return bool(
+        URGENT_RE.search(subject or "")
+        or URGENT_RE.search((body_text or "")[:URGENT_SCAN_CHARS])
+    )
+
+
+def prescore_email(
+    email: dict, sender_index: SenderIndex, record: bool = True
+) -> Optional[EmailAnalysisCreate]:
+    """Score clear-cut bulk mail locally, or return None to defer to the LLM.
+
+    email needs id, sender_email, subject and body_text; labels and
+    signal_headers (see SIGNAL_HEADERS) are used when present. Mail from a
+    VIP contact or domain is always deferred. Pass record=False for
+    lookahead checks that should not count towards prescorer_stats.
+    """
+    if sender_index.is_vip(email["sender_email"]):
+        if record:
+            prescore_stats.record(False, ["vip"])
+        return None
+
+    signals = bulk_signals(email)
+    weight = sum(_weight(signal) for signal in signals)
+    urgent = has_urgent_keywords(email["subject"], email.get("body_text"))
+    history = sender_index.sender_stats(email["sender_email"])
+
+    if weight >= STRONG_BULK_THRESHOLD and urgent:
+        score = STRONG_BULK_URGENT_SCORE
+        explanation = f"Automated or bulk email detected ({', '.join(signals)})"
+    elif weight >= BULK_THRESHOLD and not urgent:
+        score = BULK_SCORE
+        explanation = f"Automated or bulk email detected ({', '.join(signals)})"
+    elif (
+        not urgent
+        and history is not None
+        and history.email_count >= HISTORY_MIN_EMAILS
+        and history.mean_score < HISTORY_LOW_SCORE
+    ):
+        signals.append("low_priority_sender")
+        score = round(history.mean_score)
+        explanation = "Sender's recent emails have averaged low priority"
+    else:
+        if record:
+            prescore_stats.record(False, signals + (["urgent_keyword"] if urgent else []))
+        return None
+
+    if record:
+        prescore_stats.record(True, signals)
+    return EmailAnalysisCreate(
+        email_id=email["id"],
+        priority_score=score,
+        explanation=explanation,
+        action_items=[],
+        urgency_factors={
+            "is_vip": False,
+            "has_deadline": False,
+            "has_questions": False,
+            "is_urgent": False,
+            "sentiment": "neutral",
+            "prescored": True,
+        },
+    )
+
+
+def is_prescored(analysis: EmailAnalysisCreate) -> bool:
+    """True for analyses scored locally by prescore_email rather than the LLM."""
+    return bool(analysis.urgency_factors.get("prescored"))
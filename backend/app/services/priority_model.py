@@ -0,0 +1,201 @@
+import asyncio
+import math
+import re
+import zlib
+from typing import Optional
+from app.config import get_settings
+from app.models.schemas import EmailAnalysisCreate
+from app.services import db
+from app.services.analyzer import is_failed_analysis
+from app.services.cache import TTLCache
+
+settings = get_settings()
+
+SUBJECT_TOKEN_RE = re.compile(r"[a-z0-9]{3,}")
+MAX_SUBJECT_TOKENS = 20
+
+# Weights smaller than this are dropped when the model is saved
+PRUNE_BELOW = 1e-4
+
+
+def _hash(feature: str, bits: int) -> int:
+    return zlib.crc32(feature.encode()) & ((1 << bits) - 1)
+
+
+def _sigmoid(z: float) -> float:
+    if z < -30:
+        return 0.0
+    if z > 30:
+        return 1.0
+    return 1.0 / (1.0 + math.exp(-z))
+
+
+class PriorityModel:
+    """Per-user logistic model over hashed sender, domain, subject and label features.
+
+    Predicts priority / 100 and is trained online, one SGD step per
+    feedback event. Weights are a sparse map from hashed feature to
+    weight, so a user's model stays small however much mail they get.
+    sender_counts tracks feedback per hashed sender to decide when the
+    model knows a sender well enough to replace the LLM's score.
+    """
+
+    def __init__(
+        self,
+        weights: Optional[dict[int, float]] = None,
+        sender_counts: Optional[dict[int, int]] = None,
+        updates: int = 0,
+        hash_bits: int = 18,
+    ):
+        self.weights = weights or {}
+        self.sender_counts = sender_counts or {}
+        self.updates = updates
+        self.hash_bits = hash_bits
+
+    @classmethod
+    def from_row(cls, row: dict) -> "PriorityModel":
+        return cls(
+            weights={int(k): v for k, v in (row.get("weights") or {}).items()},
+            sender_counts={int(k): v for k, v in (row.get("sender_counts") or {}).items()},
+            updates=row.get("updates", 0),
+            hash_bits=row.get("hash_bits") or settings.priority_model_hash_bits,
+        )
+
+    def to_row(self) -> dict:
+        return {
+            "weights": {
+                str(k): round(v, 5)
+                for k, v in self.weights.items()
+                if abs(v) >= PRUNE_BELOW
+            },
+            "sender_counts": {str(k): v for k, v in self.sender_counts.items()},
+            "updates": self.updates,
+            "hash_bits": self.hash_bits,
+        }
+
+    def _sender_key(self, email: dict) -> int:
+        return _hash("sender:" + (email.get("sender_email") or "").lower(), self.hash_bits)
+
+    def features(self, email: dict) -> list[int]:
+        sender = (email.get("sender_email") or "").lower()
+        domain = sender.rpartition("@")[2]
+        tokens = SUBJECT_TOKEN_RE.findall((email.get("subject") or "").lower())
+
+        names = ["bias", "sender:" + sender, "domain:" + domain]
+        names.extend("kw:" + token for token in tokens[:MAX_SUBJECT_TOKENS])
+        names.extend("label:" + label for label in email.get("labels") or [])
+        return list({_hash(name, self.hash_bits) for name in names})
+
+    def predict(self, email: dict) -> float:
+        """Predicted priority score (0-100)."""
+        z = sum(self.weights.get(i, 0.0) for i in self.features(email))
+        return 100.0 * _sigmoid(z)
+
+    def update(self, email: dict, priority_score: int) -> None:
+        """Take one SGD step toward the user-provided priority score."""
+        features = self.features(email)
+        z = sum(self.weights.get(i, 0.0) for i in features)
+        gradient = _sigmoid(z) - priority_score / 100.0
+        step = settings.priority_model_learning_rate * gradient
+        for i in features:
+            self.weights[i] = self.weights.get(i, 0.0) - step
+
+        sender_key = self._sender_key(email)
+        self.sender_counts[sender_key] = self.sender_counts.get(sender_key, 0) + 1
+        self.updates += 1
+
+    def adjust(self, email: dict, llm_score: int) -> tuple[int, bool]:
+        """Blend the model into an LLM score; returns (score, replaced).
+
+        Senders with enough feedback get the model's score outright.
+        Otherwise the model's pull grows with the number of feedback
+        events, up to priority_model_max_blend.
+        """
+        predicted = self.predict(email)
+        sender_events = self.sender_counts.get(self._sender_key(email), 0)
+        if sender_events >= settings.priority_model_min_sender_events:
+            return round(predicted), True
+
+        blend = settings.priority_model_max_blend * self.updates / (self.updates + 20)
+        return round(llm_score + blend * (predicted - llm_score)), False
+
+
+class PriorityModelStore:
+    """Loads, caches and saves per-user models, serializing updates per user."""
+
+    def __init__(self):
+        self._cache = TTLCache(
+            maxsize=settings.user_cache_size, ttl=settings.user_cache_ttl_seconds
+        )
+        self._locks: dict[str, asyncio.Lock] = {}
+        self.trained = 0
+        self.adjusted = 0
+        self.replaced = 0
+
+    async def get(self, user_id: str) -> PriorityModel:
+        """The user's model; an untrained one if they have given no feedback."""
+        model = self._cache.get(user_id)
+        if model is None:
+            row = await db.get_priority_model(user_id)
+            if row is None:
+                model = PriorityModel(hash_bits=settings.priority_model_hash_bits)
+            else:
+                model = PriorityModel.from_row(row)
+            self._cache.set(user_id, model)
+        return model
+
+    async def train(self, user_id: str, email: dict, priority_score: int) -> None:
+        lock = self._locks.setdefault(user_id, asyncio.Lock())
+        async with lock:
+            model = await self.get(user_id)
+            model.update(email, priority_score)
+            await db.upsert_priority_model(user_id, model.to_row())
+            self._cache.set(user_id, model)
+            self.trained += 1
+
+    async def apply(
+        self, user_id: str, emails: list[dict], analyses: list[EmailAnalysisCreate]
+    ) -> list[EmailAnalysisCreate]:
+        """Adjust analyses (paired with emails) using the user's model, if trained."""
+        model = await self.get(user_id)
+        if model.updates == 0:
+            return analyses
+
+        adjusted = []
+        for email, analysis in zip(emails, analyses):
+            if is_failed_analysis(analysis):
+                adjusted.append(analysis)
+                continue
+
+            score, replaced = model.adjust(email, analysis.priority_score)
+            score = max(0, min(100, score))
+            self.adjusted += 1
+            self.replaced += replaced
+            adjusted.append(
+                analysis.model_copy(
+                    update={
+                        "priority_score": score,
+                        "urgency_factors": {
+                            **analysis.urgency_factors,
+                            "model_score_source": "local" if replaced else "blended",
+                            "base_priority_score": analysis.priority_score,
+                        },
+                    }
+                )
+            )
+        return adjusted
+
+    def stats(self) -> dict:
+        return {
+            "cache": self._cache.stats(),
+            "trained": self.trained,
+            "adjusted": self.adjusted,
+            "replaced": self.replaced,
+        }
+
+
+priority_model_store = PriorityModelStore()
+
+
+def get_priority_model_store() -> PriorityModelStore:
+    return priority_model_store
@@ -0,0 +1,130 @@
+import asyncio
+import base64
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+from app.config import get_settings
+from app.services import db
+from app.services.executor import run_blocking
+from app.services.gmail import watch_mailbox
+from app.services.gmail_pool import get_gmail_pool
+from app.services.jobs import get_sync_queue
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+def push_enabled() -> bool:
+    return bool(settings.gmail_pubsub_topic)
+
+
+def decode_push_message(envelope: dict) -> tuple[str, str]:
+    """Extract (emailAddress, historyId) from a Pub/Sub push envelope."""
+    data = json.loads(base64.b64decode(envelope["message"]["data"]))
+    return data["emailAddress"], str(data["historyId"])
+
+
+async def register_watch(account: dict) -> None:
+    """Start (or renew) Gmail push notifications for an account."""
+    pool = get_gmail_pool()
+    service = await pool.lease(account)
+    try:
+        response = await run_blocking(
+            watch_mailbox, service, settings.gmail_pubsub_topic
+        )
+    finally:
+        token_update = pool.release(service)
+
+    expiration = datetime.fromtimestamp(
+        int(response["expiration"]) / 1000, tz=timezone.utc
+    )
+    await db.update_account(
+        account["id"],
+        {"watch_expiration": expiration.isoformat(), **(token_update or {})},
+    )
+
+
+class PushIngestor:
+    """Turns Gmail push notifications into incremental sync jobs.
+
+    Gmail sends one notification per mailbox change, so bursts are
+    coalesced: the first notification for an account schedules a sync
+    after coalesce_seconds and later ones in that window are absorbed. The
+    sync itself uses the stored history ID, so only changed messages are
+    fetched.
+    """
+
+    def __init__(self, coalesce_seconds: float):
+        self.coalesce_seconds = coalesce_seconds
+        self._pending: dict[str, asyncio.TimerHandle] = {}
+        self.received = 0
+        self.coalesced = 0
+        self.unknown = 0
+        self._renewal_task: asyncio.Task | None = None
+
+    async def notify(self, email_address: str, history_id: str) -> None:
+        self.received += 1
+        accounts = await db.get_accounts_by_email(email_address)
+        if not accounts:
+            self.unknown += 1
+            return
+
+        loop = asyncio.get_running_loop()
+        for account in accounts:
+            if account["id"] in self._pending:
+                self.coalesced += 1
+                continue
+            self._pending[account["id"]] = loop.call_later(
+                self.coalesce_seconds, self._enqueue, account["id"], account["user_id"]
+            )
+
+    def _enqueue(self, account_id: str, user_id: str) -> None:
+        self._pending.pop(account_id, None)
+        get_sync_queue().enqueue(account_id, user_id, follow_up=True)
+
+    def start(self) -> None:
+        if push_enabled():
+            self._renewal_task = asyncio.create_task(self._renew_watches())
+
+    async def stop(self) -> None:
+        for handle in self._pending.values():
+            handle.cancel()
+        self._pending.clear()
+        if self._renewal_task:
+            self._renewal_task.cancel()
+            await asyncio.gather(self._renewal_task, return_exceptions=True)
+
+    async def _renew_watches(self) -> None:
+        """Periodically renew watches that expire within the renewal window."""
+        while True:
+            renew_before = datetime.now(timezone.utc) + timedelta(
+                seconds=settings.watch_renew_before_seconds
+            )
+            try:
+                accounts = await db.get_accounts_with_expiring_watch(renew_before)
+            except Exception:
+                logger.exception("Failed to load Gmail watches to renew")
+                accounts = []
+
+            for account in accounts:
+                try:
+                    await register_watch(account)
+                except Exception:
+                    logger.exception("Failed to renew Gmail watch for %s", account["id"])
+            await asyncio.sleep(settings.watch_renewal_interval_seconds)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": push_enabled(),
+            "received": self.received,
+            "coalesced": self.coalesced,
+            "unknown_mailbox": self.unknown,
+            "pending": len(self._pending),
+        }
+
+
+push_ingestor = PushIngestor(coalesce_seconds=settings.push_coalesce_seconds)
+
+
+def get_push_ingestor() -> PushIngestor:
+    return push_ingestor
@@ -0,0 +1,189 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from app.config import get_settings
+from app.services import db
+from app.services.jobs import get_sync_queue
+from app.services.sync import parse_timestamp
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Interval multipliers after a sync that found new mail / found none / failed
+ACTIVE_FACTOR = 0.5
+QUIET_FACTOR = 1.5
+FAILED_FACTOR = 2.0
+
+
+class _AccountState:
+    def __init__(self, account: dict, interval: float, now: datetime):
+        self.account_id = account["id"]
+        self.user_id = account["user_id"]
+        self.email_address = account["email_address"]
+        self.interval = interval
+        self.last_sync_at = parse_timestamp(account.get("last_sync_at"))
+        self.next_sync_at = (
+            self.last_sync_at + timedelta(seconds=interval)
+            if self.last_sync_at
+            else now
+        )
+        self.job_id: Optional[str] = None
+        self.last_inserted: Optional[int] = None
+        self.last_error: Optional[str] = None
+
+
+class SyncScheduler:
+    """Periodically queues syncs for every connected account.
+
+    Each account has its own interval, halved after a sync that found new
+    mail and grown by half after one that found none (within the
+    scheduler_*_interval_seconds bounds), so active mailboxes are polled
+    often and quiet ones rarely. A sync that stopped at the per-job message
+    cap is due again straight away. Due accounts are queued most overdue
+    first; the sync queue's worker count, its round-robin across users and
+    the global Gmail, Supabase and OpenAI limits bound the work itself.
+    Syncs started manually or by push notifications push the next
+    scheduled sync back.
+    """
+
+    def __init__(self, tick_seconds: float):
+        self.tick_seconds = tick_seconds
+        self._states: dict[str, _AccountState] = {}
+        self._task: asyncio.Task | None = None
+        self.scheduled = 0
+
+    def start(self) -> None:
+        if settings.scheduler_enabled:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await self.tick()
+            except Exception:
+                logger.exception("Sync scheduler tick failed")
+            await asyncio.sleep(self.tick_seconds)
+
+    async def tick(self) -> None:
+        """Refresh account states and queue syncs for accounts that are due."""
+        accounts = await db.list_sync_accounts()
+        now = datetime.now(timezone.utc)
+
+        current = {account["id"] for account in accounts}
+        for account_id in list(self._states):
+            if account_id not in current:
+                del self._states[account_id]
+
+        for account in accounts:
+            state = self._states.get(account["id"])
+            if state is None:
+                self._states[account["id"]] = _AccountState(
+                    account, settings.scheduler_default_interval_seconds, now
+                )
+                continue
+            self._observe(state, account, now)
+
+        due = sorted(
+            (
+                state
+                for state in self._states.values()
+                if state.job_id is None and state.next_sync_at <= now
+            ),
+            key=lambda state: state.next_sync_at,
+        )
+        queue = get_sync_queue()
+        for state in due:
+            state.job_id = queue.enqueue(state.account_id, state.user_id).id
+            self.scheduled += 1
+
+    def _observe(self, state: _AccountState, account: dict, now: datetime) -> None:
+        """Adapt the account's interval to its last sync, once that has finished."""
+        last_sync_at = parse_timestamp(account.get("last_sync_at"))
+        if last_sync_at and (not state.last_sync_at or last_sync_at > state.last_sync_at):
+            # Synced since we last looked, possibly outside the scheduler
+            state.last_sync_at = last_sync_at
+            state.next_sync_at = max(
+                state.next_sync_at, last_sync_at + timedelta(seconds=state.interval)
+            )
+
+        if state.job_id is None:
+            return
+        job = get_sync_queue().get(state.job_id)
+        if job is not None and job.status in ("queued", "running"):
+            return
+        state.job_id = None
+        if job is None:
+            return
+
+        finished_at = job.finished_at or now
+        if job.status == "failed":
+            factor = FAILED_FACTOR
+            state.last_error = job.error
+        else:
+            factor = ACTIVE_FACTOR if job.inserted else QUIET_FACTOR
+            state.last_inserted = job.inserted
+            state.last_error = None
+        state.interval = min(
+            settings.scheduler_max_interval_seconds,
+            max(settings.scheduler_min_interval_seconds, state.interval * factor),
+        )
+        state.next_sync_at = (
+            finished_at
+            if job.has_more
+            else finished_at + timedelta(seconds=state.interval)
+        )
+
+    def _status(self, state: _AccountState) -> str:
+        job = get_sync_queue().get(state.job_id) if state.job_id else None
+        return job.status if job and job.status in ("queued", "running") else "idle"
+
+    def account_states(self, user_id: str) -> list[dict]:
+        """Schedule state and lag of the user's accounts."""
+        now = datetime.now(timezone.utc)
+        return [
+            {
+                "account_id": state.account_id,
+                "email_address": state.email_address,
+                "state": self._status(state),
+                "interval_seconds": state.interval,
+                "last_sync_at": state.last_sync_at,
+                "next_sync_at": state.next_sync_at,
+                "lag_seconds": max(0.0, (now - state.next_sync_at).total_seconds()),
+                "last_inserted": state.last_inserted,
+                "last_error": state.last_error,
+            }
+            for state in self._states.values()
+            if state.user_id == user_id
+        ]
+
+    def stats(self) -> dict:
+        now = datetime.now(timezone.utc)
+        lags = [
+            (now - state.next_sync_at).total_seconds()
+            for state in self._states.values()
+            if state.next_sync_at <= now
+        ]
+        intervals = [state.interval for state in self._states.values()]
+        return {
+            "enabled": settings.scheduler_enabled,
+            "accounts": len(self._states),
+            "due": len(lags),
+            "scheduled": self.scheduled,
+            "max_lag_seconds": round(max(lags), 1) if lags else 0.0,
+            "mean_interval_seconds": (
+                round(sum(intervals) / len(intervals), 1) if intervals else 0.0
+            ),
+        }
+
+
+sync_scheduler = SyncScheduler(tick_seconds=settings.scheduler_tick_seconds)
+
+
+def get_sync_scheduler() -> SyncScheduler:
+    return sync_scheduler
@@ -0,0 +1,85 @@
+import logging
+from app.config import get_settings
+from app.services import db
+from app.services.cache import TTLCache
+from app.services.llm import get_llm_engine
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Texts embedded per request while indexing a sync
+EMBED_BATCH_SIZE = 100
+
+# Repeated queries (e.g. while paging) reuse their embedding
+query_embeddings = TTLCache(maxsize=settings.search_query_cache_size, ttl=3600)
+
+
+def embedding_text(email: dict) -> str:
+    """Text embedded for an email: sender, subject and the start of the body."""
+    sender = email.get("sender_name") or email["sender_email"]
+    body = (email.get("body_text") or "")[: settings.embedding_input_chars]
+    return f"From: {sender}\nSubject: {email['subject']}\n\n{body}"
+
+
+async def _embed(texts: list[str]) -> list[list[float]]:
+    return await get_llm_engine().embed(
+        texts, settings.embedding_model, settings.embedding_dimensions
+    )
+
+
+async def index_embeddings(emails: list[dict]) -> None:
+    """Embed newly stored emails for semantic search, if it is enabled.
+
+    Failures are logged and skipped; those emails are still found by
+    full-text search.
+    """
+    if not settings.semantic_search_enabled:
+        return
+
+    for start in range(0, len(emails), EMBED_BATCH_SIZE):
+        batch = emails[start : start + EMBED_BATCH_SIZE]
+        try:
+            vectors = await _embed([embedding_text(email) for email in batch])
+            await db.upsert_embeddings(
+                [
+                    {"email_id": email["id"], "embedding": vector}
+                    for email, vector in zip(batch, vectors)
+                ]
+            )
+        except Exception:
+            logger.exception("Failed to index embeddings for %d emails", len(batch))
+
+
+async def query_embedding(query: str) -> list[float]:
+    key = query.strip().lower()
+    vector = query_embeddings.get(key)
+    if vector is None:
+        [vector] = await _embed([query])
+        query_embeddings.set(key, vector)
+    return vector
+
+
+async def search_emails(
+    account_ids: list[str], query: str, mode: str, limit: int, offset: int
+) -> list[dict]:
+    """Ranked emails (with analysis) matching the query, best match first."""
+    if mode == "semantic":
+        ranked = await db.match_email_embeddings(
+            account_ids, await query_embedding(query), limit, offset
+        )
+    else:
+        ranked = await db.search_email_text(account_ids, query, limit, offset)
+
+    if not ranked:
+        return []
+
+    ids = [row["id"] for row in ranked]
+    by_id = {email["id"]: email for email in await db.get_emails(ids, account_ids)}
+    return [by_id[email_id] for email_id in ids if email_id in by_id]
+
+
+def search_stats() -> dict:
+    return {
+        "semantic_enabled": settings.semantic_search_enabled,
+        "query_embeddings": query_embeddings.stats(),
+    }
@@ -0,0 +1,159 @@
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Optional
+from app.config import get_settings
+from app.services import db
+from app.services.cache import TTLCache
+
+settings = get_settings()
+
+# Sender means are exact for the first ROLLING_WINDOW emails and then track
+# roughly the last ROLLING_WINDOW, so they follow senders whose mail changes.
+# record_sender_scores in supabase_migrations.sql uses the same window.
+ROLLING_WINDOW = 50
+
+
+class DomainTrie:
+    """Matches a domain or any of its parent domains against a set of domains.
+
+    Domains are stored label by label from the right, so a lookup costs one
+    step per label of the queried domain however many domains are stored.
+    """
+
+    _END = ""
+
+    def __init__(self, domains: list[str] = ()):
+        self._root: dict = {}
+        for domain in domains:
+            self.add(domain)
+
+    def add(self, domain: str) -> None:
+        node = self._root
+        for label in reversed(_normalize_domain(domain).split(".")):
+            node = node.setdefault(label, {})
+        node[self._END] = True
+
+    def matches(self, domain: str) -> bool:
+        node = self._root
+        for label in reversed(_normalize_domain(domain).split(".")):
+            node = node.get(label)
+            if node is None:
+                return False
+            if self._END in node:
+                return True
+        return False
+
+
+def _normalize_domain(domain: str) -> str:
+    return domain.strip().lower().lstrip("@").rstrip(".")
+
+
+@dataclass
+class SenderStats:
+    email_count: int = 0
+    mean_score: float = 0.0
+    last_seen_at: Optional[str] = None
+
+    def record(self, scores: list[int]) -> None:
+        if not scores:
+            return
+        count = len(scores)
+        batch_mean = sum(scores) / count
+        weight = min(1.0, count / min(self.email_count + count, ROLLING_WINDOW))
+        self.mean_score += (batch_mean - self.mean_score) * weight
+        self.email_count += count
+        self.last_seen_at = datetime.now(timezone.utc).isoformat()
+
+
+class SenderIndex:
+    """A user's VIP senders and per-sender priority history.
+
+    VIP addresses are a hash set and VIP domains a DomainTrie, so "is VIP"
+    never scans the preference lists. Sender stats are keyed by lowercased
+    address.
+    """
+
+    def __init__(
+        self,
+        vip_contacts: list[str] = (),
+        vip_domains: list[str] = (),
+        stats: Optional[dict[str, SenderStats]] = None,
+    ):
+        self.vip_contacts = {contact.strip().lower() for contact in vip_contacts}
+        self.vip_domains = DomainTrie(vip_domains)
+        self.stats = stats or {}
+
+    def is_vip(self, sender_email: str) -> bool:
+        sender = (sender_email or "").strip().lower()
+        return sender in self.vip_contacts or self.vip_domains.matches(
+            sender.rpartition("@")[2]
+        )
+
+    def sender_stats(self, sender_email: str) -> Optional[SenderStats]:
+        return self.stats.get((sender_email or "").strip().lower())
+
+    def historical_priority(self, sender_email: str) -> Optional[float]:
+        """Rolling mean priority of the sender's past emails, if any."""
+        stats = self.sender_stats(sender_email)
+        return stats.mean_score if stats else None
+
+    def record(self, scores_by_sender: dict[str, list[int]]) -> None:
+        for sender, scores in scores_by_sender.items():
+            self.stats.setdefault(sender, SenderStats()).record(scores)
+
+
+sender_index_cache = TTLCache(
+    maxsize=settings.user_cache_size, ttl=settings.user_cache_ttl_seconds
+)
+
+
+async def get_sender_index(user_id: str) -> SenderIndex:
+    """Get the user's sender index, served from the per-user cache when possible."""
+    index = sender_index_cache.get(user_id)
+    if index is not None:
+        return index
+
+    prefs = await db.get_preferences(user_id) or {}
+    rows = await db.get_sender_stats(user_id)
+    index = SenderIndex(
+        vip_contacts=prefs.get("vip_contacts", []),
+        vip_domains=prefs.get("vip_domains", []),
+        stats={
+            row["sender_email"]: SenderStats(
+                email_count=row["email_count"],
+                mean_score=row["mean_score"],
+                last_seen_at=row["last_seen_at"],
+            )
+            for row in rows
+        },
+    )
+    sender_index_cache.set(user_id, index)
+    return index
+
+
+async def record_sender_scores(
+    user_id: str, index: SenderIndex, emails: list[dict], scores: list[int]
+) -> None:
+    """Fold newly stored analyses into the sender stats, in memory and in the DB."""
+    scores_by_sender: dict[str, list[int]] = {}
+    for email, score in zip(emails, scores):
+        sender = email["sender_email"].strip().lower()
+        scores_by_sender.setdefault(sender, []).append(score)
+
+    if not scores_by_sender:
+        return
+
+    index.record(scores_by_sender)
+    await db.record_sender_scores(
+        user_id,
+        [sender for sender, s in scores_by_sender.items() for _ in s],
+        [score for s in scores_by_sender.values() for score in s],
+    )
+
+
+def invalidate_sender_index(user_id: str) -> None:
+    sender_index_cache.delete(user_id)
+
+
+def sender_index_stats() -> dict:
+    return sender_index_cache.stats()
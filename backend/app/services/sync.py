@@ -0,0 +1,307 @@
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from app.config import get_settings
+from app.models.schemas import (
+    EmailAnalysisCreate,
+    EmailCreate,
+    EmailWithAnalysis,
+    SyncJob,
+)
+from app.services import db
+from app.services.executor import run_blocking
+from app.services.gmail import (
+    fetch_new_emails,
+    get_email_details,
+    get_email_details_batch,
+    parse_email,
+)
+from app.services.mime import extract_body_text
+from app.services.gmail_pool import get_gmail_pool
+from app.services.analyzer import batch_analyze_emails, is_failed_analysis
+from app.services.events import get_event_hub
+from app.services.priority_model import get_priority_model_store
+from app.services.search import index_embeddings
+from app.services.prescorer import is_prescored, prescore_email
+from app.services.sender_index import (
+    SenderIndex,
+    get_sender_index,
+    record_sender_scores,
+)
+from app.services.threads import analyze_with_threads, save_thread_states
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Stored emails still unanalyzed after this long are analyzed again on the
+# next sync; younger ones may belong to a sync or backfill still running
+UNANALYZED_RETRY_AFTER = timedelta(minutes=10)
+
+
+def _chunks(items: list, size: int):
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+async def store_emails(emails: list[EmailCreate]) -> list[dict]:
+    """Bulk insert emails chunk by chunk and return the inserted ones.
+
+    Each returned dict is the email's fields plus its new row id. Emails
+    that already exist are skipped by the upsert and not returned.
+    """
+    inserted: list[dict] = []
+
+    for chunk in _chunks(emails, settings.sync_db_chunk_size):
+        by_gmail_id = {email.gmail_id: email for email in chunk}
+        for row in await db.upsert_emails(chunk):
+            email = by_gmail_id[row["gmail_id"]]
+            inserted.append(
+                {**email.model_dump(), "id": row["id"], "created_at": row["created_at"]}
+            )
+
+    return inserted
+
+
+async def store_analyses(analyses: list[EmailAnalysisCreate]) -> list[dict]:
+    rows: list[dict] = []
+    for chunk in _chunks(analyses, settings.sync_db_chunk_size):
+        rows.extend(await db.upsert_analyses(chunk))
+    return rows
+
+
+async def publish_analyzed(
+    user_id: str, emails: list[dict], analysis_rows: list[dict]
+) -> None:
+    """Send newly stored emails with their analysis to the user's streams."""
+    by_email_id = {row["email_id"]: row for row in analysis_rows}
+    await get_event_hub().publish(
+        user_id,
+        [
+            EmailWithAnalysis(
+                **email,
+                priority_score=by_email_id[email["id"]]["priority_score"],
+                analysis=by_email_id[email["id"]],
+            )
+            for email in emails
+            if email["id"] in by_email_id
+        ],
+    )
+
+
+def needs_body(email: EmailCreate, sender_index: SenderIndex) -> bool:
+    """Triage on metadata: only emails the pre-scorer can't settle need a body.
+
+    The snippet stands in for the body when checking for urgent keywords.
+    """
+    triage = {**email.model_dump(), "id": email.gmail_id, "body_text": email.snippet}
+    return prescore_email(triage, sender_index, record=False) is None
+
+
+def _fetch_parsed(
+    service, gmail_ids: list[str], account_id: str, format: str = "full"
+) -> list[EmailCreate]:
+    """Blocking: batch-fetch messages and parse them, decoding bodies included."""
+    return [
+        parse_email(message, account_id, with_body=format != "metadata")
+        for message in get_email_details_batch(service, gmail_ids, format=format)
+    ]
+
+
+def _fetch_body_text(service, gmail_id: str) -> str:
+    """Blocking: download one message and extract its body."""
+    return extract_body_text(get_email_details(service, gmail_id)["payload"])
+
+
+async def load_body(email: dict) -> Optional[str]:
+    """Fetch and store the body of an email triaged without one.
+
+    Returns None (and logs) if Gmail can't provide it, e.g. because the
+    message has been deleted since it was synced.
+    """
+    account = await db.get_account(email["account_id"])
+    if not account:
+        return None
+
+    pool = get_gmail_pool()
+    try:
+        service = await pool.lease(account)
+        try:
+            body_text = await run_blocking(_fetch_body_text, service, email["gmail_id"])
+        finally:
+            token_update = pool.release(service)
+    except Exception:
+        logger.exception("Failed to fetch body of email %s", email["id"])
+        return None
+
+    if token_update:
+        await db.update_account(account["id"], token_update)
+    await db.update_email_body(email["id"], body_text)
+    await index_embeddings([{**email, "body_text": body_text}])
+    return body_text
+
+
+async def fetch_messages(
+    service,
+    account: dict,
+    gmail_ids: list[str],
+    sender_index: SenderIndex,
+) -> tuple[list[EmailCreate], int]:
+    """Fetch and parse the messages not stored yet for an account.
+
+    With metadata triage, only messages the pre-scorer can't settle are
+    downloaded in full. Fetching and parsing both run on the blocking
+    executor. Returns the parsed emails and how many were fetched with
+    their body.
+    """
+    existing_ids = await db.get_existing_gmail_ids(account["id"], gmail_ids)
+    new_ids = [gmail_id for gmail_id in gmail_ids if gmail_id not in existing_ids]
+
+    parsed: dict[str, EmailCreate] = {}
+    full_ids = new_ids
+    if settings.sync_metadata_triage and new_ids:
+        for email in await run_blocking(
+            _fetch_parsed, service, new_ids, account["id"], "metadata"
+        ):
+            parsed[email.gmail_id] = email
+        full_ids = [
+            gmail_id
+            for gmail_id, email in parsed.items()
+            if needs_body(email, sender_index)
+        ]
+
+    full_emails = await run_blocking(_fetch_parsed, service, full_ids, account["id"])
+
+    # Triaged messages keep their metadata-only form; body_text stays None
+    # until load_body fetches it on first read
+    for email in full_emails:
+        parsed[email.gmail_id] = email
+    return list(parsed.values()), len(full_emails)
+
+
+async def load_unanalyzed(account_id: str, exclude: list[dict]) -> list[dict]:
+    """Stored emails of the account that never got an analysis."""
+    excluded = {email["id"] for email in exclude}
+    rows = await db.get_unanalyzed_emails(
+        account_id,
+        datetime.now(timezone.utc) - UNANALYZED_RETRY_AFTER,
+        settings.sync_max_messages_per_job,
+    )
+    return [
+        {**row, "received_at": datetime.fromisoformat(row["received_at"])}
+        for row in rows
+        if row["id"] not in excluded
+    ]
+
+
+async def process_emails(
+    account: dict,
+    emails: list[EmailCreate],
+    prefs: dict,
+    sender_index: SenderIndex,
+    live: bool = True,
+) -> tuple[int, int]:
+    """Store, index and analyze fetched emails and record their scores.
+
+    Emails stored by an earlier run that failed before analyzing them are
+    picked up again here, since retries skip messages already stored.
+    live=False is for historical imports: messages are analyzed on their
+    own rather than folded into rolling thread summaries (which expect
+    received order), and nothing is published to open email streams.
+    Returns how many emails were inserted and analyzed.
+    """
+    vip_contacts = prefs.get("vip_contacts", [])
+    vip_domains = prefs.get("vip_domains", [])
+
+    stored = await store_emails(emails)
+    inserted = stored + await load_unanalyzed(account["id"], stored)
+    await index_embeddings(inserted)
+
+    if live:
+        analyses, thread_states = await analyze_with_threads(
+            account["id"], inserted, vip_contacts, vip_domains, sender_index
+        )
+    else:
+        analyses = await batch_analyze_emails(
+            inserted,
+            vip_contacts=vip_contacts,
+            vip_domains=vip_domains,
+            sender_index=sender_index,
+        )
+    analyses = await get_priority_model_store().apply(
+        account["user_id"], inserted, analyses
+    )
+    analysis_rows = await store_analyses(analyses)
+    if live:
+        await save_thread_states(account["id"], thread_states, inserted, analyses)
+    # Only LLM scores feed sender history: recording pre-scored ones would
+    # let a sender's history keep confirming itself without the LLM
+    scored = [
+        (email, analysis.priority_score)
+        for email, analysis in zip(inserted, analyses)
+        if not is_failed_analysis(analysis) and not is_prescored(analysis)
+    ]
+    await record_sender_scores(
+        account["user_id"],
+        sender_index,
+        [email for email, _ in scored],
+        [score for _, score in scored],
+    )
+    if live:
+        await publish_analyzed(account["user_id"], inserted, analysis_rows)
+
+    return len(stored), len(analyses)
+
+
+def parse_timestamp(value) -> Optional[datetime]:
+    """Parse a stored timestamp (ISO string or datetime) as an aware datetime."""
+    if not value:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+async def sync_account(account: dict, job: SyncJob) -> None:
+    """Fetch, store and analyze new mail for an account, updating job progress.
+
+    Blocking Gmail and Supabase calls run on the blocking executor so the
+    event loop stays responsive while a sync is in progress.
+    """
+    prefs = await db.get_preferences(account["user_id"]) or {}
+    sender_index = await get_sender_index(account["user_id"])
+
+    pool = get_gmail_pool()
+    service = await pool.lease(account)
+    try:
+        messages, history_id, full_resync = await run_blocking(
+            fetch_new_emails,
+            service,
+            account.get("history_id"),
+            settings.sync_max_results,
+            settings.sync_max_messages_per_job,
+            parse_timestamp(account.get("last_sync_at")),
+        )
+        emails, job.bodies_fetched = await fetch_messages(
+            service, account, [msg["id"] for msg in messages], sender_index
+        )
+    finally:
+        token_update = pool.release(service)
+
+    job.fetched = len(emails)
+    # The history fetch stopped at the per-job cap; the rest is left for
+    # the next sync so a busy mailbox can't hold a worker indefinitely
+    job.has_more = (
+        not full_resync and len(messages) >= settings.sync_max_messages_per_job
+    )
+    job.inserted, job.analyzed = await process_emails(
+        account, emails, prefs, sender_index
+    )
+
+    await db.update_account(
+        account["id"],
+        {
+            "last_sync_at": datetime.now(timezone.utc).isoformat(),
+            "history_id": history_id,
+            **(token_update or {}),
+        },
+    )
@@ -0,0 +1,144 @@
+import asyncio
+from app.models.schemas import EmailAnalysisCreate
+from app.services import db
+from app.services.analyzer import (
+    analyze_thread_message,
+    batch_analyze_emails,
+    is_failed_analysis,
+)
+from app.services.prescorer import prescore_email
+from app.services.sender_index import SenderIndex
+
+
+def _seed_state(email: dict, analysis: EmailAnalysisCreate) -> dict:
+    """Initial thread state from a thread's first analyzed message."""
+    return {
+        "thread_id": email["thread_id"],
+        "subject": email["subject"],
+        "summary": f"{email['subject']}: {analysis.explanation}",
+        "priority_score": analysis.priority_score,
+        "message_count": 0,
+    }
+
+
+def _advance(state: dict, email: dict, summary: str) -> None:
+    state["summary"] = summary
+    state["message_count"] += 1
+    state["last_email_id"] = email["id"]
+    state["last_sender_email"] = email["sender_email"]
+    state["last_received_at"] = email["received_at"]
+
+
+async def analyze_with_threads(
+    account_id: str,
+    emails: list[dict],
+    vip_contacts: list[str],
+    vip_domains: list[str],
+    sender_index: SenderIndex,
+) -> tuple[list[EmailAnalysisCreate], dict[str, dict]]:
+    """Analyze new emails, reusing each thread's summary where one exists.
+
+    The first message of a thread goes through batch_analyze_emails as
+    usual. Later messages are sent to the model as just their new text plus
+    the thread's rolling summary, one at a time per thread in received
+    order. Returns analyses in input order and the updated thread states,
+    which save_thread_states persists once final scores are known.
+    """
+    states = {
+        state["thread_id"]: state
+        for state in await db.get_thread_states(
+            account_id, list({email["thread_id"] for email in emails})
+        )
+    }
+
+    fresh: list[dict] = []
+    followups: dict[str, list[dict]] = {}
+    for email in sorted(emails, key=lambda e: e["received_at"]):
+        thread_id = email["thread_id"]
+        if thread_id in states or thread_id in followups:
+            followups.setdefault(thread_id, []).append(email)
+        else:
+            fresh.append(email)
+            followups[thread_id] = []
+
+    results: dict[str, EmailAnalysisCreate] = {}
+    analyzed = await batch_analyze_emails(
+        fresh,
+        vip_contacts=vip_contacts,
+        vip_domains=vip_domains,
+        sender_index=sender_index,
+    )
+    for email, analysis in zip(fresh, analyzed):
+        results[email["id"]] = analysis
+        if is_failed_analysis(analysis):
+            continue
+        state = states[email["thread_id"]] = _seed_state(email, analysis)
+        _advance(state, email, state["summary"])
+
+    async def follow_thread(thread_emails: list[dict]) -> None:
+        for email in thread_emails:
+            state = states.get(email["thread_id"])
+            summary = state["summary"] if state else None
+            analysis = prescore_email(email, sender_index)
+            if analysis is None and state is not None:
+                analysis, summary = await analyze_thread_message(
+                    email, state, vip_contacts, vip_domains
+                )
+            elif analysis is None:
+                # The thread's first message failed, so there is no summary yet
+                [analysis] = await batch_analyze_emails(
+                    [email],
+                    vip_contacts=vip_contacts,
+                    vip_domains=vip_domains,
+                    sender_index=sender_index,
+                )
+
+            results[email["id"]] = analysis
+            if is_failed_analysis(analysis):
+                continue
+            if state is None:
+                state = states[email["thread_id"]] = _seed_state(email, analysis)
+                summary = state["summary"]
+            _advance(state, email, summary)
+
+    await asyncio.gather(
+        *(follow_thread(thread_emails) for thread_emails in followups.values())
+    )
+
+    return [results[email["id"]] for email in emails], states
+
+
+async def save_thread_states(
+    account_id: str,
+    states: dict[str, dict],
+    emails: list[dict],
+    analyses: list[EmailAnalysisCreate],
+) -> None:
+    """Persist thread states touched by this sync with their final scores."""
+    final_scores = {
+        email["id"]: analysis.priority_score
+        for email, analysis in zip(emails, analyses)
+        if not is_failed_analysis(analysis)
+    }
+
+    touched = []
+    for state in states.values():
+        last_email_id = state.get("last_email_id")
+        if last_email_id not in final_scores:
+            continue
+        state["priority_score"] = final_scores[last_email_id]
+        touched.append(
+            {
+                "account_id": account_id,
+                "thread_id": state["thread_id"],
+                "subject": state["subject"],
+                "summary": state["summary"],
+                "priority_score": state["priority_score"],
+                "message_count": state["message_count"],
+                "last_email_id": last_email_id,
+                "last_sender_email": state["last_sender_email"],
+                "last_received_at": state["last_received_at"].isoformat(),
+            }
+        )
+
+    await db.upsert_thread_states(touched)
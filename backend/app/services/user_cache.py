@@ -0,0 +1,29 @@
+from app.config import get_settings
+from app.services.cache import TTLCache
+
+settings = get_settings()
+
+# Per-user lookups that nearly every request needs but that rarely change.
+# Invalidation is per process, so with several workers the TTL bounds how
+# long another worker may serve a stale entry.
+account_ids_cache = TTLCache(
+    maxsize=settings.user_cache_size, ttl=settings.user_cache_ttl_seconds
+)
+preferences_cache = TTLCache(
+    maxsize=settings.user_cache_size, ttl=settings.user_cache_ttl_seconds
+)
+
+
+def invalidate_accounts(user_id: str) -> None:
+    account_ids_cache.delete(user_id)
+
+
+def invalidate_preferences(user_id: str) -> None:
+    preferences_cache.delete(user_id)
+
+
+def user_cache_stats() -> dict:
+    return {
+        "account_ids": account_ids_cache.stats(),
+        "preferences": preferences_cache.stats(),
+    }
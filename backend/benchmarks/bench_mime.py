@@ -0,0 +1,144 @@
+"""Microbenchmark for body extraction from Gmail message payloads.
+
+Compares app.services.mime.extract_body_text with the previous
+implementation (full decode, then truncate; plain text and
+multipart/alternative only).
+
+    cd backend
+    python -m benchmarks.bench_mime
+    python -m benchmarks.bench_mime --corpus path/to/payloads
+
+--corpus takes a directory of JSON files, each a Gmail users.messages.get
+response (format=full) or its "payload". Without it a synthetic corpus of
+large, realistically shaped payloads is generated.
+"""
+
+import argparse
+import base64
+import json
+import statistics
+import time
+from pathlib import Path
+
+from app.services.mime import extract_body_text
+
+
+def legacy_extract_body_text(payload: dict) -> str:
+    body_text = ""
+
+    if "body" in payload and payload["body"].get("data"):
+        body_text = base64.urlsafe_b64decode(payload["body"]["data"]).decode("utf-8")
+    elif "parts" in payload:
+        for part in payload["parts"]:
+            if part["mimeType"] == "text/plain" and part["body"].get("data"):
+                body_text = base64.urlsafe_b64decode(part["body"]["data"]).decode(
+                    "utf-8"
+                )
+                break
+            elif part["mimeType"] == "multipart/alternative":
+                body_text = legacy_extract_body_text(part)
+                if body_text:
+                    break
+
+    return body_text[:10000] if body_text else ""
+
+
+def _leaf(mime_type: str, text: str, charset: str = "utf-8", filename: str = "") -> dict:
+    data = base64.urlsafe_b64encode(text.encode(charset)).decode()
+    return {
+        "mimeType": mime_type,
+        "filename": filename,
+        "headers": [
+            {"name": "Content-Type", "value": f'{mime_type}; charset="{charset}"'}
+        ],
+        "body": {"size": len(text), "data": data},
+    }
+
+
+def _multipart(mime_type: str, *parts: dict) -> dict:
+    return {"mimeType": mime_type, "headers": [], "body": {"size": 0}, "parts": list(parts)}
+
+
+def synthetic_corpus() -> dict[str, dict]:
+    paragraph = (
+        "Hi team, following up on the quarterly review. Please confirm the "
+        "numbers in the attached sheet by Friday and flag anything unusual. "
+    )
+    newsletter = (
+        "<html><head><style>.x{color:red}</style></head><body>"
+        + "".join(
+            f"<table><tr><td><h2>Story {i}</h2><p>{paragraph}</p>"
+            f"<a href='https://example.com/{i}'>Read more &raquo;</a></td></tr></table>"
+            for i in range(4000)
+        )
+        + "</body></html>"
+    )
+    attachment = "x" * 2_000_000
+
+    return {
+        "plain_small": _leaf("text/plain", paragraph * 5),
+        "plain_2mb": _leaf("text/plain", paragraph * 15000),
+        "alternative_2mb": _multipart(
+            "multipart/alternative",
+            _leaf("text/plain", paragraph * 15000),
+            _leaf("text/html", f"<p>{paragraph}</p>" * 15000),
+        ),
+        "mixed_with_attachment": _multipart(
+            "multipart/mixed",
+            _multipart(
+                "multipart/alternative",
+                _leaf("text/plain", paragraph * 200),
+                _leaf("text/html", f"<p>{paragraph}</p>" * 200),
+            ),
+            _leaf("application/pdf", attachment, filename="report.pdf"),
+        ),
+        "html_only_newsletter": _multipart(
+            "multipart/related",
+            _leaf("text/html", newsletter),
+            _leaf("image/png", attachment, filename="logo.png"),
+        ),
+        "latin1_plain": _leaf("text/plain", "Résumé café " * 20000, charset="iso-8859-1"),
+    }
+
+
+def load_corpus(directory: Path) -> dict[str, dict]:
+    corpus = {}
+    for path in sorted(directory.glob("*.json")):
+        message = json.loads(path.read_text())
+        corpus[path.stem] = message.get("payload", message)
+    return corpus
+
+
+def bench(fn, payload: dict, repeat: int) -> float:
+    """Median seconds per call."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(payload)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", type=Path, help="directory of Gmail payload JSON files")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus) if args.corpus else synthetic_corpus()
+
+    print(f"{'payload':<24}{'legacy ms':>12}{'new ms':>12}{'legacy chars':>14}{'new chars':>12}")
+    for name, payload in corpus.items():
+        try:
+            legacy_text = legacy_extract_body_text(payload)
+            legacy = f"{bench(legacy_extract_body_text, payload, args.repeat) * 1e3:.3f}"
+        except Exception as e:
+            legacy_text, legacy = "", type(e).__name__
+
+        new_text = extract_body_text(payload)
+        new = bench(extract_body_text, payload, args.repeat) * 1e3
+        print(f"{name:<24}{legacy:>12}{new:>12.3f}{len(legacy_text):>14}{len(new_text):>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -10,10 +10,17 @@ CREATE TABLE IF NOT EXISTS email_accounts (
     refresh_token TEXT NOT NULL,
     token_expiry TIMESTAMPTZ NOT NULL,
     last_sync_at TIMESTAMPTZ,
+    history_id TEXT,
+    watch_expiration TIMESTAMPTZ,
     created_at TIMESTAMPTZ DEFAULT NOW(),
     UNIQUE(user_id, email_address)
 );
 
+-- Gmail history checkpoint for incremental sync (for existing deployments)
+ALTER TABLE email_accounts ADD COLUMN IF NOT EXISTS history_id TEXT;
+-- Expiry of the Gmail push watch (for existing deployments)
+ALTER TABLE email_accounts ADD COLUMN IF NOT EXISTS watch_expiration TIMESTAMPTZ;
+
 -- Emails Table
 CREATE TABLE IF NOT EXISTS emails (
     id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
@@ -28,6 +35,7 @@ CREATE TABLE IF NOT EXISTS emails (
     received_at TIMESTAMPTZ NOT NULL,
     is_read BOOLEAN DEFAULT FALSE,
     labels TEXT[] DEFAULT '{}',
+    priority_score INTEGER,
     created_at TIMESTAMPTZ DEFAULT NOW(),
     UNIQUE(account_id, gmail_id)
 );
@@ -53,12 +61,220 @@ CREATE TABLE IF NOT EXISTS user_preferences (
     updated_at TIMESTAMPTZ DEFAULT NOW()
 );
 
+-- Keep emails.priority_score in step with email_analysis so feed queries can
+-- filter and sort by priority using a single-table composite index
+ALTER TABLE emails ADD COLUMN IF NOT EXISTS priority_score INTEGER;
+
+CREATE OR REPLACE FUNCTION sync_email_priority_score()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        UPDATE emails SET priority_score = NULL WHERE id = OLD.email_id;
+        RETURN OLD;
+    END IF;
+
+    UPDATE emails SET priority_score = NEW.priority_score WHERE id = NEW.email_id;
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS email_analysis_priority_score ON email_analysis;
+CREATE TRIGGER email_analysis_priority_score
+    AFTER INSERT OR UPDATE OF priority_score OR DELETE ON email_analysis
+    FOR EACH ROW EXECUTE FUNCTION sync_email_priority_score();
+
+-- Backfill for existing deployments
+UPDATE emails e
+SET priority_score = a.priority_score
+FROM email_analysis a
+WHERE a.email_id = e.id
+  AND e.priority_score IS DISTINCT FROM a.priority_score;
+
+-- Analysis Cache Table (content-addressed, shared across users)
+CREATE TABLE IF NOT EXISTS analysis_cache (
+    cache_key TEXT PRIMARY KEY,
+    priority_score INTEGER NOT NULL CHECK (priority_score >= 0 AND priority_score <= 100),
+    explanation TEXT NOT NULL,
+    action_items JSONB DEFAULT '[]',
+    urgency_factors JSONB DEFAULT '{}',
+    created_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- Full-text search over subject, sender and body. Subject and sender rank
+-- above the body; the body is capped so huge emails stay indexable. Emails
+-- stored without a body (NULL until first read) are indexed on their snippet.
+ALTER TABLE emails ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(subject, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(sender_name, '') || ' ' || coalesce(sender_email, '')), 'B') ||
+        setweight(to_tsvector('english', left(coalesce(body_text, snippet, ''), 100000)), 'C')
+    ) STORED;
+
+CREATE OR REPLACE FUNCTION search_emails(
+    p_account_ids UUID[], p_query TEXT, p_limit INTEGER, p_offset INTEGER
+)
+RETURNS TABLE (id UUID, rank REAL)
+LANGUAGE sql STABLE
+SET search_path = public
+AS $$
+    SELECT e.id, ts_rank_cd(e.search_vector, q) AS rank
+    FROM emails e, websearch_to_tsquery('english', p_query) q
+    WHERE e.account_id = ANY(p_account_ids)
+      AND e.search_vector @@ q
+    ORDER BY rank DESC, e.received_at DESC
+    LIMIT p_limit OFFSET p_offset;
+$$;
+
+-- Semantic search (optional; needs the pgvector extension and
+-- SEMANTIC_SEARCH_ENABLED=true). Dimensions match EMBEDDING_DIMENSIONS.
+CREATE EXTENSION IF NOT EXISTS vector;
+
+CREATE TABLE IF NOT EXISTS email_embeddings (
+    email_id UUID PRIMARY KEY REFERENCES emails(id) ON DELETE CASCADE,
+    embedding vector(1536) NOT NULL,
+    created_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE OR REPLACE FUNCTION match_emails(
+    p_account_ids UUID[], p_embedding vector(1536), p_limit INTEGER, p_offset INTEGER
+)
+RETURNS TABLE (id UUID, similarity REAL)
+LANGUAGE sql STABLE
+SET search_path = public
+AS $$
+    SELECT e.id, (1 - (v.embedding <=> p_embedding))::REAL AS similarity
+    FROM email_embeddings v
+    JOIN emails e ON e.id = v.email_id
+    WHERE e.account_id = ANY(p_account_ids)
+    ORDER BY v.embedding <=> p_embedding
+    LIMIT p_limit OFFSET p_offset;
+$$;
+
+-- Only the backend (service role) runs searches, scoped to the caller's accounts
+REVOKE EXECUTE ON FUNCTION search_emails(UUID[], TEXT, INTEGER, INTEGER) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION match_emails(UUID[], vector, INTEGER, INTEGER) FROM PUBLIC, anon, authenticated;
+
+-- Thread State Table (rolling summary and latest priority per Gmail thread)
+CREATE TABLE IF NOT EXISTS thread_state (
+    account_id UUID NOT NULL REFERENCES email_accounts(id) ON DELETE CASCADE,
+    thread_id TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    priority_score INTEGER NOT NULL CHECK (priority_score >= 0 AND priority_score <= 100),
+    message_count INTEGER NOT NULL DEFAULT 1,
+    last_email_id UUID REFERENCES emails(id) ON DELETE SET NULL,
+    last_sender_email TEXT,
+    last_received_at TIMESTAMPTZ NOT NULL,
+    updated_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (account_id, thread_id)
+);
+
+-- Priority Feedback Table (training events for the per-user priority model)
+CREATE TABLE IF NOT EXISTS priority_feedback (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    user_id UUID NOT NULL REFERENCES auth.users(id) ON DELETE CASCADE,
+    email_id UUID NOT NULL REFERENCES emails(id) ON DELETE CASCADE,
+    is_correct BOOLEAN NOT NULL,
+    predicted_priority INTEGER,
+    actual_priority INTEGER CHECK (actual_priority >= 0 AND actual_priority <= 100),
+    created_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- User Priority Models Table (sparse hashed-feature weights per user)
+CREATE TABLE IF NOT EXISTS user_priority_models (
+    user_id UUID PRIMARY KEY REFERENCES auth.users(id) ON DELETE CASCADE,
+    weights JSONB NOT NULL DEFAULT '{}',
+    sender_counts JSONB NOT NULL DEFAULT '{}',
+    updates INTEGER NOT NULL DEFAULT 0,
+    hash_bits INTEGER NOT NULL DEFAULT 18,
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- Sender Stats Table (rolling per-sender priority history for each user)
+CREATE TABLE IF NOT EXISTS sender_stats (
+    user_id UUID NOT NULL REFERENCES auth.users(id) ON DELETE CASCADE,
+    sender_email TEXT NOT NULL,
+    email_count INTEGER NOT NULL DEFAULT 0,
+    mean_score REAL NOT NULL DEFAULT 0,
+    last_seen_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (user_id, sender_email)
+);
+
+-- Fold a batch of (sender, score) pairs into sender_stats atomically. Means
+-- are exact for a sender's first 50 emails and then roll over roughly the
+-- last 50 (ROLLING_WINDOW in app/services/sender_index.py).
+CREATE OR REPLACE FUNCTION record_sender_scores(
+    p_user_id UUID, p_senders TEXT[], p_scores INTEGER[]
+)
+RETURNS VOID
+LANGUAGE sql
+SET search_path = public
+AS $$
+    INSERT INTO sender_stats AS s (user_id, sender_email, email_count, mean_score, last_seen_at)
+    SELECT p_user_id, lower(sender), count(*), avg(score), NOW()
+    FROM unnest(p_senders, p_scores) AS t(sender, score)
+    GROUP BY lower(sender)
+    ON CONFLICT (user_id, sender_email) DO UPDATE SET
+        mean_score = s.mean_score + (EXCLUDED.mean_score - s.mean_score)
+            * LEAST(1.0, EXCLUDED.email_count::REAL / LEAST(s.email_count + EXCLUDED.email_count, 50)),
+        email_count = s.email_count + EXCLUDED.email_count,
+        last_seen_at = EXCLUDED.last_seen_at;
+$$;
+
+-- Only the backend (service role) records sender scores
+REVOKE EXECUTE ON FUNCTION record_sender_scores(UUID, TEXT[], INTEGER[]) FROM PUBLIC, anon, authenticated;
+
+-- Backfill Jobs Table (historical imports, checkpointed after every page)
+CREATE TABLE IF NOT EXISTS backfill_jobs (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    account_id UUID NOT NULL REFERENCES email_accounts(id) ON DELETE CASCADE,
+    user_id UUID NOT NULL REFERENCES auth.users(id) ON DELETE CASCADE,
+    status TEXT NOT NULL DEFAULT 'running' CHECK (status IN ('running', 'completed', 'failed')),
+    query TEXT,
+    page_token TEXT,
+    pages INTEGER NOT NULL DEFAULT 0,
+    listed INTEGER NOT NULL DEFAULT 0,
+    inserted INTEGER NOT NULL DEFAULT 0,
+    analyzed INTEGER NOT NULL DEFAULT 0,
+    estimated_total INTEGER,
+    error TEXT,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    updated_at TIMESTAMPTZ DEFAULT NOW(),
+    finished_at TIMESTAMPTZ
+);
+
 -- Indexes for performance
 CREATE INDEX IF NOT EXISTS idx_emails_account_id ON emails(account_id);
 CREATE INDEX IF NOT EXISTS idx_emails_received_at ON emails(received_at DESC);
 CREATE INDEX IF NOT EXISTS idx_emails_sender_email ON emails(sender_email);
 CREATE INDEX IF NOT EXISTS idx_email_analysis_priority ON email_analysis(priority_score DESC);
 CREATE INDEX IF NOT EXISTS idx_email_accounts_user_id ON email_accounts(user_id);
+CREATE INDEX IF NOT EXISTS idx_email_accounts_email_address ON email_accounts(email_address);
+-- Feed indexes; they match the (received_at, id) and
+-- (priority_score, received_at, id) keyset pagination orders
+CREATE INDEX IF NOT EXISTS idx_emails_account_received
+    ON emails(account_id, received_at DESC, id DESC);
+-- NULLS LAST matches ORDER BY priority_score DESC NULLS LAST (plain DESC
+-- sorts NULLs first, which the btree can't return in that order)
+DROP INDEX IF EXISTS idx_emails_account_priority;
+CREATE INDEX IF NOT EXISTS idx_emails_account_priority
+    ON emails(account_id, priority_score DESC NULLS LAST, received_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_analysis_cache_created_at ON analysis_cache(created_at);
+CREATE INDEX IF NOT EXISTS idx_emails_search_vector ON emails USING GIN (search_vector);
+CREATE INDEX IF NOT EXISTS idx_email_embeddings_hnsw
+    ON email_embeddings USING hnsw (embedding vector_cosine_ops);
+-- Matches the /emails/threads ranking
+CREATE INDEX IF NOT EXISTS idx_thread_state_account_priority
+    ON thread_state(account_id, priority_score DESC, last_received_at DESC);
+CREATE INDEX IF NOT EXISTS idx_priority_feedback_user_id ON priority_feedback(user_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_backfill_jobs_account ON backfill_jobs(account_id, created_at DESC);
+-- At most one running backfill per account
+CREATE UNIQUE INDEX IF NOT EXISTS idx_backfill_jobs_running
+    ON backfill_jobs(account_id) WHERE status = 'running';
 
 -- Row Level Security Policies
 
@@ -67,6 +283,15 @@ ALTER TABLE email_accounts ENABLE ROW LEVEL SECURITY;
 ALTER TABLE emails ENABLE ROW LEVEL SECURITY;
 ALTER TABLE email_analysis ENABLE ROW LEVEL SECURITY;
 ALTER TABLE user_preferences ENABLE ROW LEVEL SECURITY;
+-- analysis_cache has no policies: only the service role reads and writes it
+ALTER TABLE analysis_cache ENABLE ROW LEVEL SECURITY;
+ALTER TABLE priority_feedback ENABLE ROW LEVEL SECURITY;
+ALTER TABLE user_priority_models ENABLE ROW LEVEL SECURITY;
+ALTER TABLE sender_stats ENABLE ROW LEVEL SECURITY;
+ALTER TABLE thread_state ENABLE ROW LEVEL SECURITY;
+ALTER TABLE backfill_jobs ENABLE ROW LEVEL SECURITY;
+-- email_embeddings has no policies: only the service role reads and writes it
+ALTER TABLE email_embeddings ENABLE ROW LEVEL SECURITY;
 
 -- Email Accounts: Users can only access their own accounts
 CREATE POLICY "Users can view own email accounts"
@@ -135,3 +360,36 @@ CREATE POLICY "Users can insert own preferences"
 CREATE POLICY "Users can update own preferences"
     ON user_preferences FOR UPDATE
     USING (auth.uid() = user_id);
+
+-- Priority Feedback: Users can only access their own feedback
+CREATE POLICY "Users can view own feedback"
+    ON priority_feedback FOR SELECT
+    USING (auth.uid() = user_id);
+
+CREATE POLICY "Users can insert own feedback"
+    ON priority_feedback FOR INSERT
+    WITH CHECK (auth.uid() = user_id);
+
+-- User Priority Models: Users can view their own model
+CREATE POLICY "Users can view own priority model"
+    ON user_priority_models FOR SELECT
+    USING (auth.uid() = user_id);
+
+-- Sender Stats: Users can view their own sender stats
+CREATE POLICY "Users can view own sender stats"
+    ON sender_stats FOR SELECT
+    USING (auth.uid() = user_id);
+
+-- Thread State: Users can view threads from their own accounts
+CREATE POLICY "Users can view threads from own accounts"
+    ON thread_state FOR SELECT
+    USING (
+        account_id IN (
+            SELECT id FROM email_accounts WHERE user_id = auth.uid()
+        )
+    );
+
+-- Backfill Jobs: Users can view their own backfill progress
+CREATE POLICY "Users can view own backfill jobs"
+    ON backfill_jobs FOR SELECT
+    USING (auth.uid() = user_id);